@@ -0,0 +1,261 @@
+"""Micro-benchmarks of the Lambda dispatch path.
+
+Synthetic API Gateway events are replayed on ``TechMicroService.__call__`` and the time spent is reported by stage:
+
+    * decode: event to WSGI environ,
+    * routing: url rule matching,
+    * binding: request parameters to entry keyword arguments,
+    * view: entry function,
+    * authorize: token authorizer (TOKEN events),
+    * encode: response to Lambda response,
+    * other: remaining framework overhead (contexts, hooks, response creation).
+
+Usage from the project root::
+
+    python -m benchmarks.dispatch                   # runs all scenarios and compares to the baseline file
+    python -m benchmarks.dispatch --save            # runs all scenarios and stores the results as baseline
+    python -m benchmarks.dispatch -s get_query -n 5000
+    python -m benchmarks.dispatch -s get_records --json-backend orjson
+
+The baseline file is machine dependent and so is not versioned: store it before a change on the same machine.
+"""
+import argparse
+import base64
+import json
+import sys
+import time
+import typing as t
+from collections import defaultdict
+from functools import wraps
+from pathlib import Path
+from unittest.mock import patch
+
+from werkzeug.routing import MapAdapter
+
+from coworks import Blueprint
+from coworks import TechMicroService
+from coworks import entry
+from coworks import utils
+
+BASELINE_FILE = Path(__file__).parent / 'baseline.json'
+STAGES = ('decode', 'routing', 'binding', 'view', 'authorize', 'encode', 'other')
+BOUNDARY = 'cwsbenchboundary'
+
+
+class BenchBP(Blueprint):
+
+    @entry
+    def get_item(self, ref):
+        return {'ref': ref, 'name': f"item {ref}"}
+
+
+class BenchMS(TechMicroService):
+
+    def __init__(self):
+        super().__init__('bench')
+        self.register_blueprint(BenchBP(), url_prefix='/bp')
+
+    def token_authorizer(self, token):
+        return token == 'token'
+
+    @entry
+    def get_query(self, value=None, other=None, page=1):
+        return {'value': value, 'other': other, 'page': page}
+
+    @entry
+    def post_json(self, name=None, values=None, **kwargs):
+        return {'name': name, 'count': len(values or []), 'extra': sorted(kwargs)}
+
+    @entry
+    def post_multipart(self, text=None, file=None):
+        return {'text': text, 'size': len(file.read()) if file else 0}
+
+    @entry(binary=True, content_type='application/octet-stream')
+    def get_binary(self, size=65536):
+        return bytes(int(size))
+
+    @entry
+    def get_records(self, count=3000):
+        return [{'id': i, 'name': f"record {i}", 'active': i % 2 == 0, 'amount': i * 1.5, 'tags': ['a', 'b']}
+                for i in range(int(count))]
+
+
+def api_event(path: str, method: str, *, params=None, path_params=None, body=None, headers=None,
+              is_base64_encoded: bool = False) -> dict:
+    """Returns an API Gateway event as defined by the CoWorks request templates."""
+    headers = {
+        'accept': '*/*',
+        'authorization': 'token',
+        'content-type': 'application/json',
+        'host': 'htzd2rneg1.execute-api.eu-west-1.amazonaws.com',
+        'user-agent': 'benchmark',
+        'x-forwarded-for': '78.234.174.193, 130.176.152.165',
+        'x-forwarded-port': '443',
+        'x-forwarded-proto': 'https',
+        **(headers or {})
+    }
+    return {
+        'type': 'LAMBDA',
+        'resource': path,
+        'path': path,
+        'httpMethod': method,
+        'headers': headers,
+        'multiValueHeaders': {},
+        'body': body,
+        'queryStringParameters': None,
+        'multiValueQueryStringParameters': params or {},
+        'entryPathParameters': path_params or {},
+        'stageVariables': None,
+        'isBase64Encoded': is_base64_encoded,
+        'requestContext': {'httpMethod': method, 'entryPath': path, 'stage': 'dev', 'apiId': 'htzd2rneg1'},
+        'params': {'path': path_params or {}, 'querystring': {}, 'header': headers},
+        'context': {},
+    }
+
+
+def multipart_body() -> str:
+    parts = [
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"text\"\r\n\r\nmultipart value\r\n",
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"data.bin\"\r\n"
+        f"Content-Type: application/octet-stream\r\n\r\n{'x' * 16384}\r\n",
+        f"--{BOUNDARY}--\r\n",
+    ]
+    return base64.b64encode(''.join(parts).encode()).decode()
+
+
+SCENARIOS: t.Dict[str, dict] = {
+    'get_query': api_event('/query', 'GET', params={'value': ['a value'], 'other': ['1', '2'], 'page': ['3']}),
+    'post_json': api_event('/json', 'POST', body={'name': 'bench', 'values': list(range(100)), 'flag': True}),
+    'post_multipart': api_event('/multipart', 'POST', body=multipart_body(), is_base64_encoded=True,
+                                headers={'content-type': f"multipart/form-data; boundary={BOUNDARY}"}),
+    'get_binary': api_event('/binary', 'GET', headers={'accept': 'application/octet-stream'}),
+    'token': {
+        'type': 'TOKEN',
+        'methodArn': 'arn:aws:execute-api:eu-west-1:935392763270:htzd2rneg1/dev/GET/query',
+        'authorizationToken': 'token',
+    },
+    'blueprint': api_event('/bp/item/{ref}', 'GET', path_params={'ref': '42'}),
+    'get_records': api_event('/records', 'GET'),
+}
+
+
+class Timings:
+    """Elapsed time accumulated by stage."""
+
+    def __init__(self):
+        self.stages: t.Dict[str, float] = defaultdict(float)
+
+    def timed(self, stage: str, fun: t.Callable) -> t.Callable:
+        @wraps(fun)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fun(*args, **kwargs)
+            finally:
+                self.stages[stage] += time.perf_counter() - start
+
+        return wrapper
+
+    def reset(self) -> None:
+        self.stages.clear()
+
+
+def instrumented_app(timings: Timings, json_backend: str = None) -> TechMicroService:
+    """Creates the benchmark microservice with timed dispatch stages."""
+    app = BenchMS()
+    app.config['CWS_JSON_BACKEND'] = json_backend
+    app._get_environ = timings.timed('decode', app._get_environ)
+    app._convert_to_lambda_response = timings.timed('encode', app._convert_to_lambda_response)
+    app.authorize = timings.timed('authorize', app.authorize)
+    return app
+
+
+def run_scenario(name: str, iterations: int, json_backend: str = None) -> dict:
+    """Replays the scenario event and returns its mean stage timings and total percentiles (in microseconds)."""
+    timings = Timings()
+    create_binder = utils.create_binder
+    create_rest_proxy = utils.create_rest_proxy
+
+    def timed_binder(*args):
+        return timings.timed('binding', create_binder(*args))
+
+    def timed_rest_proxy(scaffold, func, *args):
+        return create_rest_proxy(scaffold, timings.timed('view', func), *args)
+
+    with patch.object(utils, 'create_binder', timed_binder), \
+            patch.object(utils, 'create_rest_proxy', timed_rest_proxy), \
+            patch.object(MapAdapter, 'match', timings.timed('routing', MapAdapter.match)):
+        app = instrumented_app(timings, json_backend)
+        event = SCENARIOS[name]
+
+        # Cold start is not measured
+        response = app(event, {})
+        if 'statusCode' in response and response['statusCode'] != 200:
+            raise RuntimeError(f"Scenario {name} failed: {response}")
+        timings.reset()
+
+        totals = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            app(event, {})
+            totals.append(time.perf_counter() - start)
+
+    totals.sort()
+    total = sum(totals)
+    stages = {stage: timings.stages.get(stage, 0.0) for stage in STAGES if stage != 'other'}
+    stages['other'] = max(total - sum(stages.values()), 0.0)
+    return {
+        'stages': {stage: value * 1e6 / iterations for stage, value in stages.items()},
+        'mean': total * 1e6 / iterations,
+        'p50': totals[len(totals) // 2] * 1e6,
+        'p95': totals[int(len(totals) * 0.95)] * 1e6,
+    }
+
+
+def report(results: dict, baseline: t.Optional[dict], tolerance: float) -> bool:
+    """Prints the results and returns False if a scenario mean time regressed over the baseline."""
+    ok = True
+    header = f"{'scenario':<16}" + ''.join(f"{stage:>10}" for stage in STAGES)
+    header += f"{'mean':>10}{'p50':>10}{'p95':>10}{'baseline':>10}"
+    print(header)
+    for name, result in results.items():
+        line = f"{name:<16}" + ''.join(f"{result['stages'][stage]:>10.1f}" for stage in STAGES)
+        line += f"{result['mean']:>10.1f}{result['p50']:>10.1f}{result['p95']:>10.1f}"
+        previous = (baseline or {}).get(name)
+        if previous:
+            ratio = result['mean'] / previous['mean']
+            line += f"{ratio:>9.2f}x"
+            if ratio > 1 + tolerance:
+                line += " REGRESSION"
+                ok = False
+        print(line)
+    print("Times in microseconds per invocation.")
+    return ok
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="CoWorks Lambda dispatch micro-benchmarks.")
+    parser.add_argument('--iterations', '-n', type=int, default=2000, help="Invocations by scenario.")
+    parser.add_argument('--scenario', '-s', action='append', choices=list(SCENARIOS), help="Scenario to run.")
+    parser.add_argument('--baseline', type=Path, default=BASELINE_FILE, help="Baseline results file.")
+    parser.add_argument('--save', action='store_true', help="Stores the results as baseline.")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Accepted mean time increase ratio.")
+    parser.add_argument('--json-backend', help="JSON backend module name (CWS_JSON_BACKEND), as orjson.")
+    options = parser.parse_args(argv)
+
+    scenarios = options.scenario or SCENARIOS
+    results = {name: run_scenario(name, options.iterations, options.json_backend) for name in scenarios}
+
+    baseline = None
+    if options.baseline.exists() and not options.save:
+        baseline = json.loads(options.baseline.read_text())
+    ok = report(results, baseline, options.tolerance)
+
+    if options.save:
+        options.baseline.write_text(json.dumps(results, indent=2))
+        print(f"Baseline stored in {options.baseline}.")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,5 +3,6 @@ from .coworks import BizMicroService
 from .coworks import Blueprint
 from .coworks import entry
 from .coworks import hide
+from .cache import ResponseCache
 from .globals import request
 from .version import __version__
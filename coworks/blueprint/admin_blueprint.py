@@ -1,6 +1,7 @@
 import inspect
 import sys
 from distutils.util import strtobool
+from functools import lru_cache
 from inspect import Parameter
 
 from flask import current_app
@@ -65,21 +66,26 @@ class Admin(Blueprint):
 
     def get_proxy(self):
         """Returns the calling context."""
-        env = Environment(
-            loader=PackageLoader(sys.modules[__name__].__name__),
-            autoescape=select_autoescape(['html', 'xml']))
-        env.filters["signature"] = inspect.signature
-        env.filters["positional_params"] = positional_params
-        env.filters["keyword_params"] = keyword_params
-
         data = {
             'name': current_app.name,
             'entries': current_app.url_map,
         }
-        template = env.get_template("proxy.j2")
+        template = get_environment().get_template("proxy.j2")
         return template.render(**data)
 
 
+@lru_cache(maxsize=None)
+def get_environment() -> Environment:
+    """Returns the Jinja environment of the admin templates (created once by process)."""
+    env = Environment(
+        loader=PackageLoader(sys.modules[__name__].__name__),
+        autoescape=select_autoescape(['html', 'xml']))
+    env.filters["signature"] = inspect.signature
+    env.filters["positional_params"] = positional_params
+    env.filters["keyword_params"] = keyword_params
+    return env
+
+
 def get_signature(func):
     sig = ""
     params = inspect.signature(func).parameters
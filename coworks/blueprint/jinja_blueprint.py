@@ -1,27 +1,75 @@
+import hashlib
 import typing as t
 
 from flask.globals import current_app
+from jinja2 import Environment
+from jinja2 import FileSystemBytecodeCache
+from jinja2 import FunctionLoader
 from jinja2 import Template
 from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import NotFound
 
 from coworks import Blueprint
 from coworks import entry
+from coworks.utils import LRUCache
 
 
 class Jinja(Blueprint):
 
-    def __init__(self, name: str = "jinja", autoescape: bool = True, **kwargs):
+    def __init__(self, name: str = "jinja", autoescape: bool = True, cache_size: int = 128,
+                 bytecode_cache: t.Union[bool, str] = False, **kwargs):
+        """
+        :param autoescape: autoescape the rendered values.
+        :param cache_size: number of compiled templates kept in memory (across warm invocations).
+        :param bytecode_cache: if True, the templates bytecode is also stored in the temporary directory,
+        or in the directory given.
+        """
         super().__init__(name=name, **kwargs)
         self.autoescape = autoescape
+        self.templates: t.Dict[str, str] = {}
+        self._sources = LRUCache(cache_size)
+
+        if bytecode_cache:
+            bytecode_cache = FileSystemBytecodeCache(bytecode_cache if type(bytecode_cache) is str else None)
+        self.environment = Environment(loader=FunctionLoader(self._load_template), autoescape=autoescape,
+                                       cache_size=cache_size, bytecode_cache=bytecode_cache or None)
+
+    def register_template(self, name: str, source: str) -> None:
+        """Registers a named template, rendered by the route /render/<name>."""
+        self.templates[name] = source
+
+    def get_template(self, source: str) -> Template:
+        """Returns the compiled template from its source (compiled once for a same source)."""
+        name = f"sha256:{hashlib.sha256(source.encode()).hexdigest()}"
+        self._sources.set(name, source)
+        return self.environment.get_template(name)
 
     @entry
     def post_render(self, template="", **context):
         """Returns the templating result."""
         if type(template) == FileStorage:
             template = t.cast(FileStorage, template).stream.read().decode()
-        template = Template(template, autoescape=self.autoescape)
+        return self._render(self.get_template(template), context)
+
+    @entry
+    def post_render_(self, template_name, **context):
+        """Returns the templating result of a registered template."""
+        if template_name not in self.templates:
+            raise NotFound(f"Undefined template {template_name}.")
+        return self._render(self.environment.get_template(template_name), context)
+
+    def _render(self, template: Template, context: dict):
         headers = {
             'Content-Type': 'text/html; charset=utf-8'
         }
         current_app.update_template_context(context)
         return template.render(config=current_app.config, **context), 200, headers
+
+    def _load_template(self, name: str):
+        if name in self.templates:
+            source = self.templates[name]
+            return source, None, lambda: self.templates.get(name) is source
+        source = self._sources.get(name)
+        if source is None:
+            return None
+        return source, None, lambda: True
@@ -4,9 +4,15 @@ from email import message
 import os
 import requests
 import typing as t
+from concurrent.futures import FIRST_EXCEPTION
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 from email.utils import formataddr
 from email.utils import formatdate
 from email.utils import make_msgid
+from threading import Event
+from threading import Lock
+
 from flask import current_app
 from werkzeug.datastructures import FileStorage
 
@@ -30,9 +36,22 @@ class Mail(Blueprint):
     def __init__(self, name: str = "mail",
                  env_server_var_name: str = '', env_port_var_name: str = '',
                  env_login_var_name: str = '', env_passwd_var_name: str = '',
-                 env_var_prefix: str = '', **kwargs):
+                 env_var_prefix: str = '', attachment_timeout: float = 10,
+                 attachment_max_size: int = 20 * 1024 * 1024, attachment_max_workers: int = 8, **kwargs):
+        """
+        :param attachment_timeout: connect and read timeout (in seconds) of each attachment url download.
+        :param attachment_max_size: maximum total size of the attachments downloaded for a message.
+        :param attachment_max_workers: maximum number of attachment urls downloaded concurrently.
+        """
         super().__init__(name=name, **kwargs)
         self.smtp_server = self.smtp_port = self.smtp_login = self.smtp_passwd = None
+        self.attachment_timeout = attachment_timeout
+        self.attachment_max_size = attachment_max_size
+        self.attachment_max_workers = attachment_max_workers
+        self._http: t.Optional[requests.Session] = None
+        self._smtp: t.Optional[smtplib.SMTP] = None
+        self._smtp_starttls = True
+        self._smtp_lock = Lock()
         if env_var_prefix:
             self.env_server_var_name = f"{env_var_prefix}_SERVER"
             self.env_port_var_name = f"{env_var_prefix}_PORT"
@@ -66,13 +85,73 @@ class Mail(Blueprint):
         """ Send mail.
         To send attachments, add files in the body of the request as multipart/form-data.
         """
+        try:
+            msg = self.create_message(subject=subject, from_addr=from_addr, from_name=from_name, reply_to=reply_to,
+                                      to_addrs=to_addrs, cc_addrs=cc_addrs, bcc_addrs=bcc_addrs,
+                                      body=body, body_type=body_type,
+                                      attachments=attachments, attachment_urls=attachment_urls)
+        except MessageError as e:
+            return str(e), 400
+
+        # Send email
+        try:
+            error = self.send_messages([msg], starttls=starttls)[0]
+            if error:
+                status, reason = error
+                return f"Cannot send email message (Error: {reason}).", status
+            resp = f"Mail sent to {msg['To']}"
+            current_app.logger.debug(resp)
+            return resp
+        except smtplib.SMTPAuthenticationError:
+            return "Wrong username/password : cannot connect.", 400
+        except Exception as e:
+            return f"Cannot send email message (Error: {str(e)}).", 400
+
+    @entry
+    def post_send_batch(self, messages: t.List[dict] = None, starttls=True):
+        """ Send several mails over one SMTP session.
+        Each message is defined by the send parameters (except attachments files).
+        Returns the status of each message sent.
+        """
+        results: t.List[t.Optional[dict]] = []
+        msgs = []
+        for params in messages or []:
+            try:
+                msgs.append(self.create_message(**params))
+                results.append(None)
+            except (MessageError, TypeError) as e:
+                results.append({'status': 400, 'message': str(e)})
+
+        try:
+            errors = self.send_messages(msgs, starttls=starttls)
+        except smtplib.SMTPAuthenticationError:
+            return "Wrong username/password : cannot connect.", 400
+        except Exception as e:
+            return f"Cannot send email message (Error: {str(e)}).", 400
+
+        sent = iter(zip(msgs, errors))
+        for i, result in enumerate(results):
+            if result is None:
+                msg, error = next(sent)
+                if error:
+                    status, reason = error
+                    results[i] = {'status': status, 'message': f"Cannot send email message (Error: {reason})."}
+                else:
+                    results[i] = {'status': 200, 'message': f"Mail sent to {msg['To']}"}
+        return results
 
+    def create_message(self, subject="", from_addr: str = None, from_name: str = '', reply_to: str = None,
+                       to_addrs: [str] = None, cc_addrs: [str] = None, bcc_addrs: [str] = None,
+                       body="", body_type="plain",
+                       attachments: t.Union[FileStorage, t.List[FileStorage]] = None,
+                       attachment_urls: dict = None) -> message.EmailMessage:
+        """Creates the email message, raises MessageError if not valid."""
         from_addr = from_addr or os.getenv('from_addr')
         if not from_addr:
-            return "From address not defined (from_addr:str)", 400
+            raise MessageError("From address not defined (from_addr:str)")
         to_addrs = to_addrs or os.getenv('to_addrs')
         if not to_addrs:
-            return "To addresses not defined (to_addrs:[str])", 400
+            raise MessageError("To addresses not defined (to_addrs:[str])")
 
         # Creates email
         try:
@@ -98,32 +177,139 @@ class Mail(Blueprint):
                     msg.add_attachment(attachment.stream.read(), maintype='multipart', subtype=attachment.content_type)
 
             if attachment_urls:
-                for attachment_name, attachment_url in attachment_urls.items():
-                    response = requests.get(attachment_url)
-                    if response.status_code == 200:
-                        attachment = response.content
-                        maintype, subtype = response.headers['Content-Type'].split('/')
-                        msg.add_attachment(attachment, maintype=maintype, subtype=subtype,
-                                           filename=attachment_name)
-                        current_app.logger.debug(f"Add attachment {attachment_name} - size {len(attachment)}")
-                    else:
-                        return f"Failed to download attachment, error {response.status_code}.", 400
+                for attachment_name, (attachment, content_type) in self.download_attachments(attachment_urls):
+                    maintype, subtype = content_type.split(';')[0].strip().split('/')
+                    msg.add_attachment(attachment, maintype=maintype, subtype=subtype, filename=attachment_name)
+                    current_app.logger.debug("Add attachment %s - size %d", attachment_name, len(attachment))
 
+        except MessageError:
+            raise
         except Exception as e:
-            return f"Cannot create email message (Error: {str(e)}).", 400
+            raise MessageError(f"Cannot create email message (Error: {str(e)}).")
 
-        # Send email
+        return msg
+
+    def download_attachments(self, attachment_urls: dict) -> t.List[t.Tuple[str, t.Tuple[bytes, str]]]:
+        """Downloads concurrently the attachments (name: url) and returns them in the same order.
+        Raises MessageError at the first failed download or if the total size exceeds attachment_max_size.
+        """
+        budget = _DownloadBudget(self.attachment_max_size)
+        max_workers = max(min(self.attachment_max_workers, len(attachment_urls)), 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self._download_attachment, url, budget) for url in attachment_urls.values()]
+            done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+            if not_done:
+                budget.abort.set()
+                for future in not_done:
+                    future.cancel()
+            for future in futures:
+                if future in done and future.exception():
+                    raise future.exception()
+        return list(zip(attachment_urls.keys(), (future.result() for future in futures)))
+
+    @property
+    def http(self) -> requests.Session:
+        """HTTP session kept between calls for attachment downloads."""
+        if self._http is None:
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.attachment_max_workers)
+            self._http = requests.Session()
+            self._http.mount('http://', adapter)
+            self._http.mount('https://', adapter)
+        return self._http
+
+    def _download_attachment(self, url: str, budget: '_DownloadBudget') -> t.Tuple[bytes, str]:
+        with self.http.get(url, stream=True, timeout=self.attachment_timeout) as response:
+            if response.status_code != 200:
+                raise MessageError(f"Failed to download attachment, error {response.status_code}.")
+            content_length = response.headers.get('Content-Length')
+            if content_length and content_length.isdigit():
+                budget.check(int(content_length))
+            content = bytearray()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                if budget.abort.is_set():
+                    raise MessageError("Attachment download aborted.")
+                budget.consume(len(chunk))
+                content += chunk
+            return bytes(content), response.headers.get('Content-Type', 'application/octet-stream')
+
+    def send_messages(self, msgs: t.List[message.EmailMessage],
+                      starttls=True) -> t.List[t.Optional[t.Tuple[int, str]]]:
+        """Sends the messages over the SMTP connection kept between calls (reconnects once if lost).
+        Returns the error status and reason for each message (None if sent). If the connection cannot be
+        restored, the messages not yet sent are in error (503).
+        """
+        errors: t.List[t.Optional[t.Tuple[int, str]]] = []
+        with self._smtp_lock:
+            server = self._get_smtp(starttls)
+            for index, msg in enumerate(msgs):
+                try:
+                    try:
+                        server.send_message(msg)
+                    except smtplib.SMTPServerDisconnected:
+                        server = self._connect_smtp(starttls)
+                        server.send_message(msg)
+                    errors.append(None)
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                    errors.append((400, str(e)))
+                except (smtplib.SMTPException, OSError) as e:
+                    current_app.logger.error("SMTP connection lost: %s", e)
+                    self._close_smtp()
+                    errors.extend([(503, f"SMTP connection lost: {e}")] * (len(msgs) - index))
+                    break
+        return errors
+
+    def _get_smtp(self, starttls: bool) -> smtplib.SMTP:
+        """Returns the current SMTP connection if still alive (NOOP check), a new one otherwise."""
+        if self._smtp is not None and self._smtp_starttls == starttls:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+        return self._connect_smtp(starttls)
+
+    def _connect_smtp(self, starttls: bool) -> smtplib.SMTP:
+        self._close_smtp()
+        server = smtplib.SMTP(self.smtp_server, port=self.smtp_port)
         try:
-            with smtplib.SMTP(self.smtp_server, port=self.smtp_port) as server:
-                if starttls:
-                    server.starttls()
-                server.login(self.smtp_login, self.smtp_passwd)
-                server.send_message(msg)
+            if starttls:
+                server.starttls()
+            server.login(self.smtp_login, self.smtp_passwd)
+        except Exception:
+            server.close()
+            raise
+        self._smtp, self._smtp_starttls = server, starttls
+        return server
 
-            resp = f"Mail sent to {msg['To']}"
-            current_app.logger.debug(resp)
-            return resp
-        except smtplib.SMTPAuthenticationError:
-            return "Wrong username/password : cannot connect.", 400
-        except Exception as e:
-            return f"Cannot send email message (Error: {str(e)}).", 400
+    def _close_smtp(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
+
+
+class MessageError(Exception):
+    """Invalid mail message parameters."""
+
+
+class _DownloadBudget:
+    """Total size allowed for the concurrent attachment downloads of a message."""
+
+    def __init__(self, max_size: int):
+        self.remaining = max_size
+        self.abort = Event()
+        self._lock = Lock()
+
+    def check(self, size: int) -> None:
+        if size > self.remaining:
+            self.abort.set()
+            raise MessageError("Attachments size exceeds the maximum allowed.")
+
+    def consume(self, size: int) -> None:
+        with self._lock:
+            self.remaining -= size
+            if self.remaining < 0:
+                self.abort.set()
+                raise MessageError("Attachments size exceeds the maximum allowed.")
@@ -1,20 +1,71 @@
+import base64
+import binascii
+import contextvars
 import json
 import os
+import time
 import typing as t
 import xmlrpc.client
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 
 import requests
 from aws_xray_sdk.core import xray_recorder
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from werkzeug.exceptions import HTTPException
 from coworks import Blueprint
 from coworks import entry
+from coworks.utils import LRUCache
 from flask import Response
 from flask import abort
+from flask import current_app
+from flask import request
+
+
+SESSION_EXPIRED_CODE = 100
+LIGHT_EXCLUDED_TYPES = ('binary', 'one2many')
 
 
 class AccessDenied(Exception):
     ...
 
 
+def _order_fields(order: t.Optional[str]) -> t.List[str]:
+    """Returns the field names of an order specification ('name desc, id')."""
+    return [part.split()[0] for part in (order or '').split(',') if part.strip()]
+
+
+class KeepAliveTransport(xmlrpc.client.Transport):
+    """XML-RPC transport on a pooled HTTP session (connections are kept alive between calls).
+    Only the connection errors are retried as the request was not sent.
+    """
+
+    def __init__(self, scheme: str = 'https', timeout: float = None, retries: int = 0, pool_maxsize: int = 10):
+        super().__init__()
+        self.scheme = scheme
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(total=retries, connect=retries, read=0, redirect=0, status=0, backoff_factor=0.1)
+        adapter = HTTPAdapter(pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, host, handler, request_body, verbose=False):
+        headers = {'Content-Type': 'text/xml', 'User-Agent': self.user_agent}
+        res = self.session.post(f"{self.scheme}://{host}{handler}", data=request_body, headers=headers,
+                                timeout=self.timeout)
+        if res.status_code != 200:
+            raise xmlrpc.client.ProtocolError(f"{host}{handler}", res.status_code, res.reason, dict(res.headers))
+        parser, unmarshaller = self.getparser()
+        parser.feed(res.content)
+        parser.close()
+        return unmarshaller.close()
+
+    def close(self):
+        self.session.close()
+
+
 class Odoo(Blueprint):
     """Odoo blueprint.
     This blueprint uses the API Rest application which must be installed on ODOO server.
@@ -27,10 +78,34 @@ class Odoo(Blueprint):
 
     def __init__(self, name='odoo',
                  env_url_var_name: str = '', env_dbname_var_name: str = '', env_user_var_name: str = '',
-                 env_passwd_var_name: str = '', env_var_prefix: str = '', **kwargs):
+                 env_passwd_var_name: str = '', env_var_prefix: str = '', timeout: float = 30, retries: int = 2,
+                 session_ttl: float = 3600, batch_max_workers: int = 8, fields_ttl: float = 3600,
+                 light_projection: bool = False, validate_fields: bool = True, **kwargs):
+        """
+        :param timeout: connect and read timeout (in seconds) of the XML-RPC calls.
+        :param retries: number of retries on connection errors.
+        :param session_ttl: time to live (in seconds) of the web session if the cookie has no expiry.
+        :param batch_max_workers: maximum number of queries of a batch executed concurrently.
+        :param fields_ttl: time to live (in seconds) of the models fields definition kept in memory.
+        :param light_projection: if no fields are requested, binary and one2many fields are not read.
+        :param validate_fields: checks the requested fields and order before calling odoo.
+        """
         super().__init__(name=name, **kwargs)
         self.url = self.dbname = self.user = self.passwd = None
         self.uid = None
+        self.timeout = timeout
+        self.retries = retries
+        self._transport: t.Optional[KeepAliveTransport] = None
+        self._proxies: t.Dict[str, xmlrpc.client.ServerProxy] = {}
+        self._proxies_lock = Lock()
+        self.session_ttl = session_ttl
+        self.batch_max_workers = batch_max_workers
+        self.light_projection = light_projection
+        self.validate_fields = validate_fields
+        self._fields = LRUCache(ttl=fields_ttl)
+        self._fields_lock = Lock()
+        self._session_id: t.Optional[str] = None
+        self._session_expires = 0.0
         if env_var_prefix:
             self.env_url_var_name = f"{env_var_prefix}_URL"
             self.env_dbname_var_name = f"{env_var_prefix}_DBNAME"
@@ -57,21 +132,17 @@ class Odoo(Blueprint):
             if not self.passwd:
                 raise EnvironmentError(f'{self.env_passwd_var_name} not defined in environment.')
 
-            common = xmlrpc.client.ServerProxy(f'{self.url}/xmlrpc/2/common')
-            self.uid = common.authenticate(self.dbname, self.user, self.passwd, {})
+            self.uid = self.server_proxy('common').authenticate(self.dbname, self.user, self.passwd, {})
 
         @self.before_app_request
-        def set_session():
-            if not self.uid:
+        def check_uid():
+            if not self.uid and self._is_routed():
                 abort(403)
 
-            # TO BE REMOVED
-            self.session_id, status_code = self.get_session_id_old()
-
     @entry
     def kw(self, model: str, method: str = "search_read", id: t.Union[int, str] = None, fields: t.List[str] = None,
            order: str = None, domain: t.List[t.Tuple[str, str, t.Any]] = None, limit: int = None, page_size=None,
-           page=0, ensure_one=False):
+           page=0, ensure_one=False, cursor: str = None, light: bool = None):
         """Searches with API for records based on the args.
         See also: https://www.odoo.com/documentation/14.0/developer/reference/addons/orm.html#odoo.models.Model.search
         @param model: python as a dot separated class name.
@@ -81,25 +152,38 @@ class Odoo(Blueprint):
         @param order: oder of result.
         @param domain: domain for records.
         @param limit: maximum number of records to return from odoo (default: all).
-        @param page_size: pagination done by the microservice.
+        @param page_size: pagination done by the microservice (the result contains the cursor of the next page),
+        cannot be defined with limit.
         @param page: current page searched.
         @param ensure_one: raise error if result is not one (404) and only one (400) object.
+        @param cursor: cursor of the page searched, as returned in the previous page.
+        @param light: if no fields are defined, binary and one2many fields are not read (default: light_projection).
         """
         if id and domain:
             abort(Response("Domain and Id parameters cannot be defined tin same time", status=400))
+        if limit and page_size:
+            abort(Response("Limit and page_size parameters cannot be defined in same time", status=400))
+        fields = self._projection(model, fields, order, light) if method == 'search_read' else fields
 
         params = {}
+        offset = 0
         if id:
             domain = [[('id', '=', id)]]
         else:
             domain = domain if domain else [[]]
-            if limit:
-                params.update({'limit': limit})
+            if page_size or cursor:
+                order = self._stable_order(order)
+            if limit or page_size:
+                params.update({'limit': limit or page_size})
             if order:
                 params.update({'order': order})
-            if page:
+            if cursor:
+                offset = self._decode_cursor(cursor, order)
+            elif page:
                 page_size = page_size or limit
-                params.update({'offset': page * page_size})
+                offset = page * page_size
+            if offset:
+                params.update({'offset': offset})
         if fields:
             params.update({'fields': fields})
         res, status_code = self.odoo_execute_kw(model, method, domain, params)
@@ -109,13 +193,92 @@ class Odoo(Blueprint):
         if method == 'search_count':
             return res
 
-        if len(res) == 0:
+        if len(res) == 0 and not cursor:
             return abort(Response("Not found", status=404))
         if ensure_one:
             if len(res) > 1:
                 return abort(Response("More than one element found and ensure_one parameters was set", 404))
             return res[0]
-        return {"ids": [rec['id'] for rec in res], "values": res}
+        result = {"ids": [rec['id'] for rec in res], "values": res}
+        if (page_size or cursor) and len(res) == params.get('limit'):
+            result['cursor'] = self._encode_cursor(offset + len(res), order)
+        return result
+
+    @entry(binary=True, content_type='application/x-ndjson')
+    def kw_export(self, model: str, fields: t.List[str] = None, order: str = None,
+                  domain: t.List[t.Tuple[str, str, t.Any]] = None, chunk_size: int = 1000, light: bool = None):
+        """Exports the records as newline delimited JSON, read from odoo by chunks.
+        The records are encoded while read, the result size stays limited by the Lambda payload size
+        (use kw with page_size for larger exports).
+        @param model: python as a dot separated class name.
+        @param fields: record fields for result.
+        @param order: oder of result (completed by id to be stable).
+        @param domain: domain for records.
+        @param chunk_size: number of records read by call to odoo.
+        @param light: if no fields are defined, binary and one2many fields are not read (default: light_projection).
+        """
+        try:
+            chunk_size = int(chunk_size)
+        except (TypeError, ValueError):
+            chunk_size = 0
+        if chunk_size < 1:
+            abort(Response("Chunk size must be a positive integer", status=400))
+        fields = self._projection(model, fields, order, light)
+        domain = domain if domain else [[]]
+        params = {'order': self._stable_order(order), 'limit': chunk_size}
+        if fields:
+            params.update({'fields': fields})
+
+        # the first chunk is read before the response to report errors
+        chunk, _ = self.odoo_execute_kw(model, "search_read", domain, {**params, 'offset': 0})
+
+        def records(chunk):
+            offset = 0
+            while True:
+                for rec in chunk:
+                    yield json.dumps(rec, default=str) + '\n'
+                if len(chunk) < params['limit']:
+                    return
+                offset += len(chunk)
+                chunk, _ = self.odoo_execute_kw(model, "search_read", domain, {**params, 'offset': offset})
+
+        return Response(records(chunk), mimetype='application/x-ndjson')
+
+    @entry
+    def kw_batch(self, queries: t.List[dict] = None):
+        """Executes concurrently several kw queries.
+        @param queries: list of kw parameters, each query may be identified by a request_id key (default: its index).
+        Returns the status and the result (or the error message) of each query keyed by its request id.
+        """
+        queries = queries or []
+        if not isinstance(queries, list):
+            abort(Response("Queries must be a list", status=400))
+        request_ids = [str(query.get('request_id', index) if isinstance(query, dict) else index)
+                       for index, query in enumerate(queries)]
+        if len(set(request_ids)) != len(request_ids):
+            abort(Response("Request ids must be unique", status=400))
+
+        def execute(query):
+            if not isinstance(query, dict):
+                return {'status': 400, 'message': "Query must be an object"}
+            params = {key: value for key, value in query.items() if key != 'request_id'}
+            try:
+                return {'status': 200, 'result': self.kw(**params)}
+            except HTTPException as e:
+                if e.response is not None:
+                    return {'status': e.response.status_code, 'message': e.response.get_data(as_text=True)}
+                return {'status': e.code, 'message': e.description}
+            except TypeError as e:
+                return {'status': 400, 'message': str(e)}
+            except xmlrpc.client.Fault as e:
+                return {'status': 500, 'message': e.faultString}
+            except Exception as e:
+                return {'status': 500, 'message': str(e)}
+
+        max_workers = max(min(self.batch_max_workers, len(queries)), 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, execute, query) for query in queries]
+            return {request_id: future.result() for request_id, future in zip(request_ids, futures)}
 
     @entry
     def gql(self, query: str = None):
@@ -178,8 +341,7 @@ class Odoo(Blueprint):
         """Standard externalm API entries.
         See also: https://www.odoo.com/documentation/15.0/developer/misc/api/odoo.html
         """
-        models = xmlrpc.client.ServerProxy(f'{self.url}/xmlrpc/2/object')
-        res = models.execute_kw(self.dbname, self.uid, self.passwd, model, method, *args, **kwargs)
+        res = self.server_proxy('object').execute_kw(self.dbname, self.uid, self.passwd, model, method, *args, **kwargs)
         return res, 200
 
     @xray_recorder.capture()
@@ -191,31 +353,122 @@ class Odoo(Blueprint):
         res = requests.post(f'{self.url}/graphql', json=query, headers=headers)
         return res.json(), 200
 
+    def server_proxy(self, service: str) -> xmlrpc.client.ServerProxy:
+        """Returns the XML-RPC proxy of the service, sharing the keep-alive transport of the blueprint.
+        The proxies are created under lock as they may be first requested by the batch threads."""
+        proxy = self._proxies.get(service)
+        if proxy is None:
+            with self._proxies_lock:
+                proxy = self._proxies.get(service)
+                if proxy is None:
+                    if self._transport is None:
+                        scheme = self.url.split('://')[0]
+                        self._transport = KeepAliveTransport(scheme, timeout=self.timeout, retries=self.retries,
+                                                             pool_maxsize=max(self.batch_max_workers, 10))
+                    url = f'{self.url}/xmlrpc/2/{service}'
+                    proxy = self._proxies[service] = xmlrpc.client.ServerProxy(url, transport=self._transport)
+        return proxy
+
+    def fields_get(self, model: str) -> t.Dict[str, dict]:
+        """Returns the fields definition of the model (kept in memory for fields_ttl seconds)."""
+        with self._fields_lock:
+            fields = self._fields.get(model)
+        if fields is None:
+            fields, _ = self.odoo_execute_kw(model, 'fields_get', [], {'attributes': ['type', 'store', 'string']})
+            with self._fields_lock:
+                self._fields.set(model, fields)
+        return fields
+
+    def invalidate_fields(self, model: str = None) -> None:
+        """Removes the fields definition of the model kept in memory, or of all models if not defined."""
+        with self._fields_lock:
+            if model:
+                self._fields.pop(model)
+            else:
+                self._fields.clear()
+
+    def _projection(self, model: str, fields: t.Optional[t.List[str]], order: t.Optional[str],
+                    light: t.Optional[bool]) -> t.Optional[t.List[str]]:
+        """Validates the fields and order, and returns the fields read (the light projection if not defined)."""
+        light = self.light_projection if light is None else light
+        validate = self.validate_fields and (fields or order)
+        if not validate and (fields or not light):
+            return fields
+
+        definitions = self.fields_get(model)
+        if validate:
+            unknown = [field for field in fields or [] if field not in definitions]
+            unknown += [field for field in _order_fields(order) if field != 'id' and field not in definitions]
+            if unknown:
+                abort(Response(f"Undefined fields for {model}: {', '.join(unknown)}", status=400))
+        if fields or not light:
+            return fields
+        return [name for name, field in definitions.items() if field.get('type') not in LIGHT_EXCLUDED_TYPES]
+
+    @staticmethod
+    def _stable_order(order: t.Optional[str]) -> str:
+        """Completes the order by id so pages do not overlap."""
+        if not order:
+            return 'id'
+        if 'id' in _order_fields(order):
+            return order
+        return f"{order}, id"
+
+    @staticmethod
+    def _encode_cursor(offset: int, order: str) -> str:
+        return base64.urlsafe_b64encode(json.dumps([offset, order]).encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str, order: str) -> int:
+        try:
+            offset, cursor_order = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError, TypeError):
+            abort(Response("Invalid cursor", status=400))
+        if cursor_order != order or type(offset) is not int:
+            abort(Response("Cursor not defined for this order", status=400))
+        return offset
+
+    def _is_routed(self) -> bool:
+        """Checks if the current request is routed to this blueprint."""
+        view = current_app.view_functions.get(request.endpoint)
+        name = getattr(view, '__CWS_BLUEPRINT', None)
+        return name is not None and current_app.blueprints.get(name) is self
+
     def _get_uid(self):
         """Open or checks the connection."""
         try:
-            common = xmlrpc.client.ServerProxy(f'{self.url}/xmlrpc/2/common')
-            uid = common.authenticate(self.dbname, self.user, self.passwd, {})
+            uid = self.server_proxy('common').authenticate(self.dbname, self.user, self.passwd, {})
             return uid, 200
         except Exception as e:
             return str(e), 401
 
     # TO BE REMOVED
-    def odoo_post_old(self, path, params, headers=None) -> t.Tuple[t.Union[str, dict], int]:
+    @property
+    def session_id(self) -> str:
+        """Web session id, kept until its expiry or its rejection by Odoo."""
+        if self._session_id is None or time.time() >= self._session_expires:
+            self._session_id, self._session_expires = self.get_session_id_old()
+        return self._session_id
+
+    # TO BE REMOVED
+    def odoo_post_old(self, path, params, headers=None, retry=True) -> t.Tuple[t.Union[str, dict], int]:
         _params = {'jsonrpc': "2.0", 'session_id': self.session_id}
         headers = headers or {}
         res = requests.post(path, params=_params, json=params, headers=headers)
         try:
             result = res.json()
             if 'error' in result:
+                if result['error'].get('code') == SESSION_EXPIRED_CODE and retry:
+                    self._session_id = None
+                    return self.odoo_post_old(path, params, headers=headers, retry=False)
                 return f"{result['error']['message']}:{result['error']['data']}", 404
             return result, res.status_code
         except (json.decoder.JSONDecodeError, Exception):
             return res.text, 500
 
     # TO BE REMOVED
-    def get_session_id_old(self):
-        """Open or checks the connection."""
+    def get_session_id_old(self) -> t.Tuple[str, float]:
+        """Opens a web session and returns its id and expiry time."""
         try:
             data = {
                 'jsonrpc': "2.0",
@@ -233,6 +486,8 @@ class Odoo(Blueprint):
 
             data = json.loads(res.text)
             if data['result']['session_id']:
-                return res.cookies["session_id"], 200
+                cookie = next(cookie for cookie in res.cookies if cookie.name == 'session_id')
+                return cookie.value, cookie.expires or time.time() + self.session_ttl
         except Exception as e:
             raise AccessDenied()
+        raise AccessDenied()
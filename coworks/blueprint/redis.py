@@ -10,7 +10,7 @@ class RedisBlueprint(Blueprint):
         super().__init__(**kwargs)
         self.redis = None
 
-        @self.before_first_activation
+        @self.before_app_first_request
         def load_env_var(*args, **kwargs):
             endpoint = os.getenv(endpoint_env_var_name)
             passwd = os.getenv(passwd_env_var_name)
@@ -0,0 +1,124 @@
+import binascii
+import hashlib
+import json
+import typing as t
+from abc import ABC
+from abc import abstractmethod
+
+from flask import Response
+from werkzeug.datastructures import Headers
+from werkzeug.datastructures import MultiDict
+from werkzeug.urls import url_encode
+
+from .utils import LRUCache
+
+
+class CacheBackend(ABC):
+    """Storage of the cached responses."""
+
+    @abstractmethod
+    def get(self, key: str) -> t.Optional[dict]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: dict, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU backend, kept across warm invocations of the container."""
+
+    def __init__(self, maxsize: int = 128):
+        self.cache = LRUCache(maxsize)
+
+    def get(self, key: str) -> t.Optional[dict]:
+        return self.cache.get(key)
+
+    def set(self, key: str, value: dict, ttl: float) -> None:
+        self.cache.set(key, value, ttl=ttl)
+
+    def delete(self, key: str) -> None:
+        self.cache.pop(key)
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis backend shared by all the containers.
+
+    The client may be a redis client or a RedisBlueprint (its client is then created at first request).
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    @property
+    def client(self):
+        from .coworks import Blueprint
+
+        return self._client.redis if isinstance(self._client, Blueprint) else self._client
+
+    def get(self, key: str) -> t.Optional[dict]:
+        value = self.client.get(key)
+        if value is None:
+            return None
+        value = json.loads(value)
+        value['data'] = binascii.a2b_base64(value['data'])
+        return value
+
+    def set(self, key: str, value: dict, ttl: float) -> None:
+        value = {**value, 'data': binascii.b2a_base64(value['data'], newline=False).decode()}
+        self.client.set(key, json.dumps(value), px=int(ttl * 1000))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+
+class ResponseCache:
+    """Cache of the GET responses of an entry.
+
+    The responses are keyed on the microservice name, the request path, the normalized query parameters
+    and the vary header values. Only 200 responses are cached.
+    """
+
+    def __init__(self, ttl: float = 60, maxsize: int = 128, vary: t.Union[str, t.Iterable[str]] = (),
+                 backend: CacheBackend = None):
+        """
+        :param ttl: time to live of the cached responses (in seconds).
+        :param maxsize: maximum number of responses kept (memory backend only).
+        :param vary: header (or headers) on which the response varies.
+        :param backend: cache backend (memory if not defined).
+        """
+        self.ttl = ttl
+        self.vary = (vary,) if isinstance(vary, str) else tuple(vary)
+        self.backend = backend or MemoryCacheBackend(maxsize)
+
+    def key(self, app, path: str, args: t.Union[MultiDict, dict], headers: t.Union[Headers, dict]) -> str:
+        args = args if isinstance(args, MultiDict) else MultiDict(args)
+        headers = Headers(headers) if isinstance(headers, dict) else headers
+        query = url_encode(sorted(args.items(multi=True)))
+        vary = [headers.get(header, '') for header in self.vary]
+        digest = hashlib.sha256(json.dumps([path, query, vary]).encode()).hexdigest()
+        return f"cws:{app.name}:{digest}"
+
+    def get(self, app, key: str) -> t.Optional[Response]:
+        value = self.backend.get(key)
+        if value is None:
+            return None
+        return app.response_class(value['data'], status=value['status'], headers=value['headers'])
+
+    def set(self, key: str, response: Response) -> None:
+        if response.status_code != 200 or response.is_streamed:
+            return
+        value = {
+            'status': response.status_code,
+            'headers': [(k, v) for k, v in response.headers.items() if k.lower() != 'content-length'],
+            'data': response.get_data(),
+        }
+        self.backend.set(key, value, self.ttl)
+
+    def invalidate(self, app, path: str, query: dict = None, headers: dict = None) -> None:
+        """Removes the cached response of the request."""
+        self.backend.delete(self.key(app, path, query or {}, headers or {}))
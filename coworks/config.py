@@ -14,6 +14,7 @@ DEFAULT_LOCAL_WORKSPACE = 'local'
 DEFAULT_DEV_WORKSPACE = 'dev'
 
 ENV_FILE_SUFFIX = '.json'
+ROUTES_FILE_NAME = 'cws_routes.json'
 SECRET_ENV_FILE_SUFFIX = '.secret.json'
 
 
@@ -1,10 +1,19 @@
-import base64
+import binascii
+import dataclasses
+import hashlib
+import importlib
 import logging
 import os
+import sys
 import typing as t
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from dataclasses import field
 from functools import partial
 from inspect import isfunction
+from io import BytesIO
+from pathlib import Path
+from threading import Lock
 
 import click
 from flask import Blueprint as FlaskBlueprint
@@ -12,6 +21,7 @@ from flask import Flask
 from flask import Response
 from flask import abort
 from flask import current_app
+from flask import json
 from flask.blueprints import BlueprintSetupState
 from flask.ctx import RequestContext
 from flask.testing import FlaskClient
@@ -19,16 +29,30 @@ from werkzeug.datastructures import WWWAuthenticate
 from werkzeug.exceptions import HTTPException, Unauthorized
 from werkzeug.exceptions import InternalServerError
 from werkzeug.routing import Rule
+from werkzeug.urls import url_encode
 
+from .cache import ResponseCache
 from .config import Config
 from .config import DEFAULT_DEV_WORKSPACE
 from .config import DEFAULT_LOCAL_WORKSPACE
 from .config import DevConfig
 from .config import LocalConfig
 from .config import ProdConfig
+from .config import ROUTES_FILE_NAME
 from .globals import request
 from .utils import HTTP_METHODS
+from .utils import LRUCache
+from .utils import RouteEntry
 from .utils import add_coworks_routes
+from .utils import add_route_entry
+from .utils import Base64DecodeStream
+from .utils import COMPRESSION_ENCODINGS
+from .utils import base64_encode_chunks
+from .utils import compress
+from .utils import create_route_entries
+from .utils import make_absolute
+from .utils import is_json
+from .utils import is_json_native
 from .utils import trim_underscores
 from .wrappers import ApiResponse
 from .wrappers import Request
@@ -40,17 +64,25 @@ from .wrappers import TokenResponse
 #
 
 
-def entry(fun: t.Callable = None, binary: bool = False, content_type: str = None, no_auth: bool = False) -> t.Callable:
+def entry(fun: t.Callable = None, binary: bool = False, content_type: str = None, no_auth: bool = False,
+          cache: t.Union[float, ResponseCache] = None, etag: t.Union[bool, t.Callable] = False,
+          max_content_length: int = None, max_memory_size: int = None) -> t.Callable:
     """Decorator to create a microservice entry point from function name.
     :param fun: the entry function.
     :param binary: allow payload without transformation.
     :param content_type: force default content-type.
     :param no_auth: set authorizer.
+    :param cache: GET responses cache (or its time to live in seconds for an in memory cache).
+    :param etag: adds an ETag to the GET responses, computed from the body or from the version key returned by
+    this function if callable (called with the entry parameters).
+    :param max_content_length: maximum request body size (MAX_CONTENT_LENGTH configuration value if not defined).
+    :param max_memory_size: maximum size of uploaded files kept in memory (CWS_UPLOAD_MEMORY_SIZE if not defined).
     """
     if fun is None:
         if binary and not content_type:
             content_type = 'application/octet-stream'
-        return partial(entry, binary=binary, content_type=content_type, no_auth=no_auth)
+        return partial(entry, binary=binary, content_type=content_type, no_auth=no_auth, cache=cache, etag=etag,
+                       max_content_length=max_content_length, max_memory_size=max_memory_size)
 
     def get_path(start):
         name_ = fun.__name__[start:]
@@ -74,6 +106,10 @@ def entry(fun: t.Callable = None, binary: bool = False, content_type: str = None
     fun.__CWS_BINARY = binary
     fun.__CWS_CONTENT_TYPE = content_type
     fun.__CWS_NO_AUTH = no_auth
+    fun.__CWS_CACHE = cache if cache is None or isinstance(cache, ResponseCache) else ResponseCache(ttl=cache)
+    fun.__CWS_ETAG = etag
+    fun.__CWS_MAX_CONTENT_LENGTH = max_content_length
+    fun.__CWS_MAX_MEMORY_SIZE = max_memory_size
 
     return fun
 
@@ -106,6 +142,17 @@ class ScheduleEntry:
     fun: t.Callable
 
 
+@dataclass
+class LazyBlueprint:
+    """A lazy blueprint is a blueprint registered with the lazy option : its routes and first request functions are
+    initialized only when a request is first received on its url prefix."""
+
+    state: BlueprintSetupState
+    prefix: str
+    first_request_funcs: t.List[t.Callable] = field(default_factory=list)
+    initialized: bool = False
+
+
 class CoworksClient(FlaskClient):
     """Redefined to force mimetype to be 'text/plain' in case of string return.
     """
@@ -143,10 +190,26 @@ class Blueprint(FlaskBlueprint):
 
         # Defer blueprint route initialization.
         if not options.get('hide_routes', False):
-            app.deferred_init_routes_functions.append(partial(add_coworks_routes, state.app, state))
+            if options.get('lazy', False):
+                app.add_lazy_blueprint(state)
+            else:
+                app.deferred_init_routes_functions.append(partial(add_coworks_routes, state.app, state))
 
         return state
 
+    def before_app_first_request(self, f: t.Callable) -> t.Callable:
+        """Redefined to defer the function until the first request on the blueprint if registered in lazy mode."""
+
+        def add_first_request_func(state):
+            lazy_blueprint = state.app.lazy_blueprints.get(state.name)
+            if lazy_blueprint:
+                lazy_blueprint.first_request_funcs.append(f)
+            else:
+                state.app.before_first_request_funcs.append(f)
+
+        self.record_once(add_first_request_func)
+        return f
+
 
 class TechMicroService(Flask):
     """Simple tech microservice.
@@ -172,31 +235,119 @@ class TechMicroService(Flask):
         self.request_class = Request
         self.response_class = ApiResponse
 
+        # Direct event to WSGI environ dispatch (the test client is used if not set)
+        self.config.setdefault('CWS_DIRECT_DISPATCH', True)
+
+        # Lambda payload limit for binary responses
+        self.config.setdefault('CWS_MAX_PAYLOAD_SIZE', 6 * 1024 * 1024)
+
+        # JSON module used to serialize returned values (flask.json if not set)
+        self.config.setdefault('CWS_JSON_BACKEND', None)
+        self._cws_json_backend = None
+
+        # Authorizer decisions cache (disabled if no time to live) and policy on all stage resources
+        self.config.setdefault('CWS_AUTHORIZER_CACHE_SIZE', 128)
+        self.config.setdefault('CWS_AUTHORIZER_CACHE_TTL', 0)
+        self.config.setdefault('CWS_AUTHORIZER_WILDCARD', True)
+        self._cws_authorizer_cache = None
+
+        # Batch records dispatch (SQS or Kinesis event source)
+        self.config.setdefault('CWS_BATCH_PATH', '/')
+        self.config.setdefault('CWS_BATCH_MAX_WORKERS', 8)
+
+        # Uploaded files kept in memory up to this size, then spooled in a temporary file
+        self.config.setdefault('CWS_UPLOAD_MEMORY_SIZE', 512 * 1024)
+
+        # Conditional GET requests for all entries (else only for entries defined with etag)
+        self.config.setdefault('CWS_ETAG', False)
+
+        # Responses compression negotiated on Accept-Encoding (disabled if no minimum size)
+        self.config.setdefault('CWS_COMPRESSION_MIN_SIZE', None)
+        self.config.setdefault('CWS_COMPRESSION_MIMETYPES', [
+            'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+            'text/css', 'text/csv', 'text/html', 'text/plain', 'text/xml',
+        ])
+
         self.deferred_init_routes_functions: t.List[t.Callable] = []
+        self.route_entries: t.List[RouteEntry] = []
+        self._cws_loaded_route_entries: t.Optional[t.List[RouteEntry]] = None
         self._cws_app_initialized = False
         self._cws_conf_updated = False
+        self._cws_warm = False
+
+        self.lazy_blueprints: t.Dict[str, LazyBlueprint] = {}
+        self._cws_lazy_first_request_funcs: t.List[t.Callable] = []
+        self._cws_lazy_lock = Lock()
+        self._cws_lazy_initializing = False
 
         @self.before_request
         def before():
             self._check_token()
+            if self._cws_lazy_first_request_funcs:
+                self._try_trigger_lazy_first_request_functions()
             rp = request.path
             if rp != '/' and rp.endswith('/'):
                 abort(Response("Trailing slash avalaible only on deployed version"))
 
     def app_context(self):
         """Override to initialize coworks microservice."""
-        if not self._cws_app_initialized:
-            add_coworks_routes(self)
-            for fun in self.deferred_init_routes_functions:
-                fun()
-            self._cws_app_initialized = True
+        self._init_routes()
         return super().app_context()
 
+    def load_route_entries(self, route_entries: t.List[t.Union[RouteEntry, dict]]) -> None:
+        """Defines the routes from a previous routes snapshot instead of discovering them by reflection.
+
+        Must be called before the first application context.
+        """
+        if self._cws_app_initialized:
+            raise RuntimeError("Route entries cannot be loaded once the microservice is initialized.")
+        self._cws_loaded_route_entries = [e if isinstance(e, RouteEntry) else RouteEntry(**e) for e in route_entries]
+
+    def add_lazy_blueprint(self, state: BlueprintSetupState) -> None:
+        """Defers the blueprint initialization until the first request on its url prefix."""
+        if not state.url_prefix:
+            raise ValueError(f"Blueprint {state.name} registered in lazy mode must have an url prefix.")
+        prefix = make_absolute('', state.url_prefix).rstrip('/')
+        self.lazy_blueprints[state.name] = LazyBlueprint(state, prefix)
+
+    def routes_snapshot(self) -> t.List[dict]:
+        """Returns the serializable description of all the routes created for the microservice."""
+        with self.app_context():
+            route_entries = [*self.route_entries]
+            for lazy_blueprint in self.lazy_blueprints.values():
+                if not lazy_blueprint.initialized:
+                    route_entries.extend(create_route_entries(self, lazy_blueprint.state))
+            return [dataclasses.asdict(route_entry) for route_entry in route_entries]
+
+    def routes_source_hash(self) -> str:
+        """Returns the hash code of the source files defining the microservice and blueprints classes."""
+        classes = [self.__class__, *(bp.__class__ for bp in self.blueprints.values())]
+        files = set()
+        for cls in classes:
+            for klass in cls.__mro__:
+                if issubclass(klass, (TechMicroService, Blueprint)):
+                    module = sys.modules.get(klass.__module__)
+                    file = getattr(module, '__file__', None)
+                    if file:
+                        files.add(file)
+
+        # files paths differ from build to Lambda runtime so only contents are hashed
+        digests = sorted(hashlib.sha256(Path(file).read_bytes()).hexdigest() for file in files)
+        return hashlib.sha256(''.join(digests).encode()).hexdigest()
+
+    def write_routes_file(self, path: t.Union[str, Path]) -> None:
+        """Writes the routes snapshot file loaded at cold start to avoid routes discovery."""
+        data = {'hash': self.routes_source_hash(), 'routes': self.routes_snapshot()}
+        Path(path).write_text(json.dumps(data))
+
     def request_context(self, environ: dict) -> RequestContext:
         """Redefined to :
         - initialize the environment
+        - initialize the lazy blueprint called if needed
         - add Lambda event and context in globals.
         """
+        if self.lazy_blueprints:
+            self._init_lazy_blueprints(environ.get('PATH_INFO', ''))
         ctx = super().request_context(environ)
         ctx.aws_event = environ.get('aws_event')
         ctx.aws_context = environ.get('aws_context')
@@ -244,21 +395,143 @@ class TechMicroService(Flask):
             return True
         return token == os.getenv('TOKEN')
 
+    @property
+    def authorizer_cache(self) -> t.Optional[LRUCache]:
+        """Cache of the authorizer decisions (None if disabled)."""
+        ttl = self.config['CWS_AUTHORIZER_CACHE_TTL']
+        maxsize = self.config['CWS_AUTHORIZER_CACHE_SIZE']
+        if not ttl or not maxsize:
+            return None
+        cache = self._cws_authorizer_cache
+        if cache is None or cache.ttl != ttl or cache.maxsize != maxsize:
+            cache = self._cws_authorizer_cache = LRUCache(maxsize, ttl)
+        return cache
+
+    def authorize(self, token: str) -> t.Union[bool, str]:
+        """Returns the authorizer decision for this token, using the decision cache if enabled."""
+        cache = self.authorizer_cache
+        if cache is None:
+            return self.token_authorizer(token)
+
+        key = self._token_key(token)
+        decision = cache.get(key)
+        if decision is None:
+            decision = self.token_authorizer(token)
+            cache.set(key, decision)
+        return decision
+
+    def invalidate_token(self, token: str = None) -> None:
+        """Removes the cached authorizer decision for this token, or all cached decisions if no token given."""
+        if self._cws_authorizer_cache is None:
+            return
+        if token is None:
+            self._cws_authorizer_cache.clear()
+        else:
+            self._cws_authorizer_cache.pop(self._token_key(token))
+
     def base64decode(self, data):
         """Base64 decode function used for lambda interaction."""
-        if not isinstance(data, bytes):
-            data = data.encode('ascii')
-        output = base64.b64decode(data)
-        return output
+        return binascii.a2b_base64(data)
 
     def base64encode(self, data):
         """Base64 encode function used for lambda interaction."""
-        if not isinstance(data, bytes):
+        if not isinstance(data, (bytes, bytearray, memoryview)):
             msg = f'Expected bytes type for body with binary Content-Type. Got {type(data)} type body instead.'
             raise ValueError(msg)
-        data = base64.b64encode(data).decode('ascii')
+        data = binascii.b2a_base64(data, newline=False).decode('ascii')
         return data
 
+    def make_response(self, rv) -> ApiResponse:
+        """Redefined to serialize the dict or list returned values with the JSON backend."""
+        if isinstance(rv, tuple):
+            if rv and isinstance(rv[0], (dict, list)):
+                rv = (self._json_response(rv[0]), *rv[1:])
+        elif isinstance(rv, (dict, list)):
+            rv = self._json_response(rv)
+        return super().make_response(rv)
+
+    def process_response(self, response: ApiResponse) -> ApiResponse:
+        """Redefined to compress the response, add the ETag to the GET responses and answer not modified to
+        conditional requests."""
+        response = super().process_response(response)
+        encoding = self._compression_encoding(response)
+
+        # the ETag is computed on the uncompressed body to be stable, weak if the body is compressed
+        if request.method in ('GET', 'HEAD') and response.status_code == 200:
+            view_function = self.view_functions.get(request.url_rule.endpoint) if request.url_rule else None
+            with_etag = self.config['CWS_ETAG'] or getattr(view_function, '__CWS_ETAG', False)
+            if with_etag and not response.is_streamed:
+                if 'ETag' not in response.headers:
+                    response.add_etag()
+                if encoding:
+                    etag, _ = response.get_etag()
+                    response.set_etag(etag, weak=True)
+                response.make_conditional(request)
+
+        if encoding and response.status_code == 200:
+            response.set_data(compress(response.get_data(), encoding))
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    def _compression_encoding(self, response: ApiResponse) -> t.Optional[str]:
+        """Returns the encoding of the response body if it must be compressed.
+
+        The compression is not done in the Lambda context as the API Gateway integration response is transformed
+        by a mapping template (see the deploy ``--compression-size`` option for gateway compression).
+        """
+        if self.config['CWS_COMPRESSION_MIN_SIZE'] is None or request.in_lambda_context:
+            return None
+        if response.is_streamed or response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return None
+        if response.status_code != 200 or response.mimetype not in self.config['CWS_COMPRESSION_MIMETYPES']:
+            return None
+        if (response.calculate_content_length() or 0) < self.config['CWS_COMPRESSION_MIN_SIZE']:
+            return None
+
+        response.vary.add('Accept-Encoding')
+        return request.accept_encodings.best_match(COMPRESSION_ENCODINGS)
+
+    @property
+    def json_backend(self):
+        """Returns the JSON module defined by the CWS_JSON_BACKEND configuration value.
+
+        The module (or its name) must define the functions ``dumps(obj, default=None)``, returning str or bytes,
+        and ``loads(s)`` as orjson for example.
+        """
+        backend = self.config['CWS_JSON_BACKEND']
+        if backend is None:
+            return None
+        if self._cws_json_backend is None or self._cws_json_backend[0] is not backend:
+            module = importlib.import_module(backend) if isinstance(backend, str) else backend
+            self._cws_json_backend = (backend, module)
+        return self._cws_json_backend[1]
+
+    def json_dumps(self, value) -> t.Union[str, bytes]:
+        """Serializes the value with the JSON backend."""
+        encoder = self.json_encoder()
+        backend = self.json_backend
+        if backend is not None:
+            try:
+                return backend.dumps(value, default=encoder.default)
+            except TypeError as e:
+                self.logger.debug("JSON backend cannot serialize value (%s), flask.json used.", e)
+
+        # same as flask jsonify
+        indent = None
+        separators = (",", ":")
+        if self.config["JSONIFY_PRETTYPRINT_REGULAR"] or self.debug:
+            indent = 2
+            separators = (", ", ": ")
+        dumped = json.dumps(value, app=self, default=encoder.default, indent=indent, separators=separators)
+        return f"{dumped}\n"
+
+    def json_loads(self, data: t.Union[str, bytes]) -> t.Any:
+        """Deserializes the data with the JSON backend."""
+        backend = self.json_backend
+        if backend is not None:
+            return backend.loads(data)
+        return json.loads(data, app=self)
+
     def __call__(self, arg1, arg2) -> dict:
         """Main microservice entry point."""
 
@@ -275,30 +548,125 @@ class TechMicroService(Flask):
     def _lambda_handler(self, event: t.Dict[str, t.Any], context: t.Dict[str, t.Any]):
         """Lambda handler.
         """
-        self.logger.debug(f"Event: {event}")
-        self.logger.debug(f"Context: {context}")
+        # Event and context are formatted only if logged
+        self.logger.debug("Event: %s", event)
+        self.logger.debug("Context: %s", context)
+
+        # Warm invocations skip the container initialization checks
+        if not self._cws_warm:
+            self._cold_start()
 
-        self._update_config(load_env=False)
         if event.get('type') == 'TOKEN':
             return self._token_handler(event, context)
+        if self._is_batch_event(event):
+            return self._batch_handler(event, context)
         return self._api_handler(event, context)
 
     def _token_handler(self, event: t.Dict[str, t.Any], context: t.Dict[str, t.Any]) -> dict:
         """Authorization token handler.
         """
-        self.logger.debug(f"Calling {self.name} for authorization : {event}")
+        self.logger.debug("Calling %s for authorization : %s", self.name, event)
 
         try:
-            res = self.token_authorizer(event['authorizationToken'])
-            return TokenResponse(res, event['methodArn']).json
+            res = self.authorize(event['authorizationToken'])
+            return TokenResponse(res, event['methodArn'], wildcard=self.config['CWS_AUTHORIZER_WILDCARD']).json
         except Exception as e:
-            self.logger.debug(f"Error in token handler for {self.name} : {e}")
-            return TokenResponse(False, event['methodArn']).json
+            self.logger.debug("Error in token handler for %s : %s", self.name, e)
+            return TokenResponse(False, event['methodArn'], wildcard=self.config['CWS_AUTHORIZER_WILDCARD']).json
+
+    @staticmethod
+    def _is_batch_event(event: t.Dict[str, t.Any]) -> bool:
+        records = event.get('Records')
+        return bool(records) and records[0].get('eventSource') in ('aws:sqs', 'aws:kinesis')
+
+    def _batch_handler(self, event: t.Dict[str, t.Any], context: t.Dict[str, t.Any]) -> dict:
+        """Records batch handler.
+
+        Each record is dispatched as a POST request on an entry, the records being processed concurrently in a
+        bounded pool. Records of a same group (FIFO message group or Kinesis partition key) are processed in order.
+        Returns the partial batch failure response.
+        """
+        groups: t.Dict[t.Union[str, int], t.List[dict]] = {}
+        for index, record in enumerate(event['Records']):
+            groups.setdefault(self._record_group(record) or index, []).append(record)
+
+        def process(records: t.List[dict]) -> t.List[str]:
+            for i, record in enumerate(records):
+
+                # each record has its own application context (so its own flask.g)
+                with self.app_context():
+                    processed = self._record_handler(record, context)
+                if not processed:
+                    return [self._record_id(r) for r in records[i:]]
+            return []
+
+        failures: t.List[str] = []
+        max_workers = max(1, min(self.config['CWS_BATCH_MAX_WORKERS'], len(groups)))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(process, records) for records in groups.values()]
+            for future in futures:
+                failures.extend(future.result())
+
+        return {'batchItemFailures': [{'itemIdentifier': failure} for failure in failures]}
+
+    def _record_handler(self, record: t.Dict[str, t.Any], context: t.Dict[str, t.Any]) -> bool:
+        """Dispatches the record on its entry and returns True if successfully processed."""
+        try:
+            response = self._direct_api_handler(self._get_record_event(record), context)
+            if response['statusCode'] < 400:
+                return True
+            self.logger.debug("Record %s not processed : %s", self._record_id(record), response)
+        except Exception as e:
+            self.logger.error("Record %s not processed : %s", self._record_id(record), e)
+        return False
+
+    def _get_record_event(self, record: t.Dict[str, t.Any]) -> dict:
+        """Creates the API event for a record.
+
+        The path of the entry is given by the 'path' message attribute (SQS) or the CWS_BATCH_PATH configuration value.
+        The record data is posted as JSON and the record itself is available in the event 'record' key.
+        """
+        if record['eventSource'] == 'aws:kinesis':
+            data = self.base64decode(record['kinesis']['data']).decode()
+            path = None
+        else:
+            data = record['body']
+            path = record.get('messageAttributes', {}).get('path', {}).get('stringValue')
+        try:
+            body = json.loads(data)
+        except ValueError:
+            body = data
+
+        return {
+            'type': 'LAMBDA',
+            'path': path or self.config['CWS_BATCH_PATH'],
+            'httpMethod': 'POST',
+            'headers': {'content-type': 'application/json'},
+            'body': body,
+            'multiValueQueryStringParameters': {},
+            'params': {'path': {}},
+            'record': record,
+        }
+
+    @staticmethod
+    def _record_group(record: t.Dict[str, t.Any]) -> t.Optional[str]:
+        if record['eventSource'] == 'aws:kinesis':
+            return record['kinesis']['partitionKey']
+        return record.get('attributes', {}).get('MessageGroupId')
+
+    @staticmethod
+    def _record_id(record: t.Dict[str, t.Any]) -> str:
+        if record['eventSource'] == 'aws:kinesis':
+            return record['kinesis']['sequenceNumber']
+        return record['messageId']
 
     def _api_handler(self, event: t.Dict[str, t.Any], context: t.Dict[str, t.Any]) -> dict:
         """API handler.
         """
-        self.logger.debug(f"Calling {self.name} by api : {event}")
+        self.logger.debug("Calling %s by api : %s", self.name, event)
+
+        if self.config['CWS_DIRECT_DISPATCH']:
+            return self._direct_api_handler(event, context)
 
         def full_path():
             url = event['path']
@@ -330,6 +698,47 @@ class TechMicroService(Flask):
             error = e if isinstance(e, HTTPException) else InternalServerError(original_exception=e)
             return self._structured_error(error)
 
+    def _direct_api_handler(self, event: t.Dict[str, t.Any], context: t.Dict[str, t.Any]) -> dict:
+        """API handler calling the WSGI application with an environ built from the event.
+        """
+        try:
+            environ = self._get_environ(event, context)
+
+            # The response is directly converted if the WSGI application is not wrapped by a middleware
+            if getattr(self.wsgi_app, '__func__', None) is TechMicroService.wsgi_app:
+                ctx = self.request_context(environ)
+                error: t.Optional[BaseException] = None
+                try:
+                    try:
+                        ctx.push()
+                        resp = self.full_dispatch_request()
+                    except Exception as e:
+                        error = e
+                        resp = self.handle_exception(e)
+                    return self._convert_to_lambda_response(resp)
+                finally:
+                    if self.should_ignore_error(error):
+                        error = None
+                    ctx.pop(error)
+
+            response_start = []
+
+            def start_response(status, headers, exc_info=None):
+                response_start[:] = [status, headers]
+
+            app_iter = self.wsgi_app(environ, start_response)
+            try:
+                body = b"".join(app_iter)
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+            status, headers = response_start
+            resp = self.response_class(body, status=status, headers=headers)
+            return self._convert_to_lambda_response(resp)
+        except Exception as e:
+            error = e if isinstance(e, HTTPException) else InternalServerError(original_exception=e)
+            return self._structured_error(error)
+
     def _flask_handler(self, environ: t.Dict[str, t.Any], start_response: t.Callable[[t.Any], None]):
         """Flask handler.
         """
@@ -337,6 +746,12 @@ class TechMicroService(Flask):
         self._update_config(load_env=True)
         return self.wsgi_app(environ, start_response)
 
+    def _cold_start(self):
+        """Initializes the container on its first Lambda invocation."""
+        self._update_config(load_env=False)
+        self._init_routes()
+        self._cws_warm = True
+
     def _update_config(self, *, load_env: bool, workspace: str = None):
         if not self._cws_conf_updated:
             workspace = workspace or os.environ.get('WORKSPACE', DEFAULT_DEV_WORKSPACE)
@@ -348,6 +763,90 @@ class TechMicroService(Flask):
                 config.load_environment_variables(self.root_path)
             self._cws_conf_updated = True
 
+    def _init_routes(self):
+        """Creates the routes of the microservice and its blueprints (except lazy ones)."""
+        if not self._cws_app_initialized:
+            if self._cws_loaded_route_entries is None:
+                self._load_routes_file()
+            if self._cws_loaded_route_entries is not None:
+                for route_entry in self._cws_loaded_route_entries:
+                    if route_entry.blueprint not in self.lazy_blueprints:
+                        add_route_entry(self, route_entry)
+            else:
+                add_coworks_routes(self)
+                for fun in self.deferred_init_routes_functions:
+                    fun()
+            self._cws_app_initialized = True
+
+    def _init_lazy_blueprints(self, path: str):
+        """Creates the routes of the lazy blueprints for the path if not already done."""
+        for lazy_blueprint in self.lazy_blueprints.values():
+            if lazy_blueprint.initialized:
+                continue
+            if path != lazy_blueprint.prefix and not path.startswith(f"{lazy_blueprint.prefix}/"):
+                continue
+
+            self._init_routes()
+            with self._cws_lazy_lock:
+                if lazy_blueprint.initialized:
+                    continue
+
+                self._cws_lazy_initializing = True
+                try:
+                    name = lazy_blueprint.state.name
+                    if self._cws_loaded_route_entries is not None:
+                        for route_entry in self._cws_loaded_route_entries:
+                            if route_entry.blueprint == name:
+                                add_route_entry(self, route_entry)
+                    else:
+                        add_coworks_routes(self, lazy_blueprint.state)
+                finally:
+                    self._cws_lazy_initializing = False
+
+                self._cws_lazy_first_request_funcs.extend(lazy_blueprint.first_request_funcs)
+                lazy_blueprint.initialized = True
+
+    def _try_trigger_lazy_first_request_functions(self):
+        """Calls the first request functions of the lazy blueprints just initialized."""
+        with self._cws_lazy_lock:
+            while self._cws_lazy_first_request_funcs:
+                self.ensure_sync(self._cws_lazy_first_request_funcs[0])()
+                self._cws_lazy_first_request_funcs.pop(0)
+
+    def _is_setup_finished(self) -> bool:
+        """Redefined to allow lazy blueprints routes creation after the first request."""
+        return not self._cws_lazy_initializing and super()._is_setup_finished()
+
+    def _load_routes_file(self):
+        """Loads the routes snapshot file created by the zip command if deployed and not stale."""
+        task_root = os.getenv('LAMBDA_TASK_ROOT')
+        if not task_root:
+            return
+
+        routes_file = Path(task_root) / ROUTES_FILE_NAME
+        if not routes_file.is_file():
+            return
+
+        try:
+            data = json.loads(routes_file.read_text())
+            if data['hash'] != self.routes_source_hash():
+                self.logger.debug(f"Routes file {routes_file} is stale, routes are discovered.")
+                return
+
+            route_entries = [RouteEntry(**e) for e in data['routes']]
+            for route_entry in route_entries:
+                if route_entry.blueprint and route_entry.blueprint not in self.blueprints:
+                    self.logger.debug(f"Blueprint {route_entry.blueprint} undefined, routes are discovered.")
+                    return
+            self._cws_loaded_route_entries = route_entries
+        except (Exception,) as e:
+            self.logger.debug(f"Cannot load routes file {routes_file} ({e}), routes are discovered.")
+
+    @staticmethod
+    def _token_key(token: str) -> str:
+        """The tokens are not kept in the cache, only their digests."""
+        return hashlib.sha256(token.encode()).hexdigest()
+
     def _check_token(self):
         if not request.in_lambda_context:
 
@@ -363,19 +862,11 @@ class TechMicroService(Flask):
                 token = request.headers.get('Authorization', self.config.get('DEFAULT_TOKEN'))
                 if token is None:
                     raise Unauthorized(www_authenticate=WWWAuthenticate(auth_type="basic"))
-                valid = self.token_authorizer(token)
+                valid = self.authorize(token)
                 if not valid:
                     abort(403)
 
     def _get_kwargs(self, event):
-        def is_json(mt):
-            return (
-                    mt == "application/json"
-                    or type(mt) is str
-                    and mt.startswith("application/")
-                    and mt.endswith("+json")
-            )
-
         kwargs = {}
         content_type = event['headers'].get('content-type')
         if content_type:
@@ -389,7 +880,7 @@ class TechMicroService(Flask):
         body = event['body']
         if body and is_encoded:
             body = self.base64decode(body)
-        self.logger.debug(f"Body: {body}")
+        self.logger.debug("Body: %s", body)
 
         if is_json(content_type):
             kwargs['json'] = body
@@ -397,13 +888,96 @@ class TechMicroService(Flask):
         kwargs['data'] = body
         return kwargs
 
+    def _get_environ(self, event, context) -> dict:
+        """Creates the WSGI environ from the API Gateway event."""
+        headers = {k.lower(): v for k, v in event['headers'].items()}
+        content_type = headers.pop('content-type', None)
+        headers.pop('content-length', None)
+
+        # Replaces route parameters
+        path = event['path'].format(**event['params']['path'])
+
+        query_string = ''
+        params = event['multiValueQueryStringParameters']
+        if params:
+            query_string = url_encode(params)
+
+        body = b''
+        stream = None
+        if event['httpMethod'] in ['PUT', 'POST']:
+            body = event['body']
+            if body and event.get('isBase64Encoded', False):
+                stream = self._base64_stream(body)
+                body = b'' if stream else self.base64decode(body)
+            self.logger.debug("Body: %s", body)
+
+            if body is None:
+                body = b''
+            elif isinstance(body, str):
+                body = json.dumps(body).encode() if is_json(content_type) else body.encode()
+            elif not isinstance(body, bytes):
+                if is_json(content_type):
+                    body = json.dumps(body).encode()
+                else:
+                    content_type = content_type or "application/x-www-form-urlencoded"
+                    body = url_encode(body).encode('ascii')
+
+        scheme = headers.get('x-forwarded-proto', 'http')
+        environ = {
+            'REQUEST_METHOD': event['httpMethod'],
+            'SCRIPT_NAME': '',
+            'PATH_INFO': path.encode().decode('latin1'),
+            'QUERY_STRING': query_string,
+            'SERVER_NAME': headers.get('host', 'localhost'),
+            'SERVER_PORT': headers.get('x-forwarded-port', '443' if scheme == 'https' else '80'),
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scheme,
+            'wsgi.input': stream[0] if stream else BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': False,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+            'aws_event': event,
+            'aws_context': context,
+        }
+        if content_type:
+            environ['CONTENT_TYPE'] = content_type
+        if stream:
+            environ['CONTENT_LENGTH'] = str(stream[1])
+        elif body:
+            environ['CONTENT_LENGTH'] = str(len(body))
+        for key, value in headers.items():
+            environ[f"HTTP_{key.upper().replace('-', '_')}"] = value
+        return environ
+
+    def _base64_stream(self, data) -> t.Optional[t.Tuple[t.BinaryIO, int]]:
+        """Returns the stream decoding the base64 body by chunks and the decoded size, or None if the body must
+        be decoded as a whole (base64decode redefined or not a canonical base64 string)."""
+        if getattr(self.base64decode, '__func__', None) is not TechMicroService.base64decode:
+            return None
+        if not isinstance(data, str) or len(data) % 4 or '\n' in data:
+            return None
+        return Base64DecodeStream(data), len(data) // 4 * 3 - data[-2:].count('=')
+
     def _convert_to_lambda_response(self, resp):
         """Convert Lambda response."""
 
-        # returns JSON structure
+        # not modified response has no body
+        if resp.status_code == 304:
+            headers = {k: v for k, v in resp.headers.items() if k.lower() not in ('content-length', 'content-type')}
+            return self._structured_payload("", 304, headers)
+
+        # returns JSON structure (not serialized if the value contains only JSON types, parsed otherwise)
         if resp.is_json:
+            json_value = getattr(resp, 'json_value', None)
+            if json_value is not None and is_json_native(json_value):
+                headers = resp.headers
+                if getattr(resp, 'json_pending', False):
+                    headers = {k: v for k, v in headers.items() if k.lower() != 'content-length'}
+                return self._structured_payload(json_value, resp.status_code, headers)
             try:
-                return self._structured_payload(resp.json, resp.status_code, resp.headers)
+                return self._structured_payload(self.json_loads(resp.get_data()), resp.status_code, resp.headers)
             except (Exception,):
                 resp.mimetype = "text/plain"
 
@@ -414,8 +988,17 @@ class TechMicroService(Flask):
             except ValueError:
                 pass
 
-        # returns direct payload
-        return self.base64encode(resp.get_data())
+        # returns direct payload encoded by chunks
+        try:
+            return base64_encode_chunks(resp.iter_encoded(), resp.content_length, self.config['CWS_MAX_PAYLOAD_SIZE'])
+        except ValueError as e:
+            raise InternalServerError(f"Binary response too large for Lambda: {e}")
+
+    def _json_response(self, value) -> ApiResponse:
+        """Creates the JSON response, the value being serialized only when the body is needed."""
+        resp = self.response_class(mimetype=self.config["JSONIFY_MIMETYPE"])
+        resp.set_json(value, self.json_dumps)
+        return resp
 
     def _structured_payload(self, body, status_code, headers):
         return {
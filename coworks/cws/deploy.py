@@ -11,6 +11,7 @@ from flask.cli import with_appcontext
 from functools import cached_property
 from jinja2 import BaseLoader
 from jinja2 import Environment
+from jinja2 import FileSystemBytecodeCache
 from jinja2 import PackageLoader
 from jinja2 import select_autoescape
 from pathlib import Path
@@ -25,6 +26,19 @@ from .zip import zip_command
 
 UID_SEP = '_'
 
+# Jinja environments by terraform class
+_jinja_envs: t.Dict[type, Environment] = {}
+
+
+class ListParamType(click.ParamType):
+    """Comma separated values, also given as a list in the project file."""
+    name = "list"
+
+    def convert(self, value, param, ctx) -> t.List[str]:
+        if isinstance(value, str):
+            value = value.split(',')
+        return [v.strip() for v in value if v and v.strip()]
+
 
 @dataclass
 class TerraformResource:
@@ -156,7 +170,14 @@ class TerraformLocal:
 
     @property
     def jinja_env(self) -> Environment:
-        return Environment(loader=self.template_loader, autoescape=select_autoescape(['html', 'xml']))
+        """Jinja environment shared by the instances of the class, so the templates are compiled once by process
+        (and their bytecode kept in the temporary directory between processes)."""
+        env = _jinja_envs.get(self.__class__)
+        if env is None:
+            env = _jinja_envs[self.__class__] = Environment(loader=self.template_loader,
+                                                            autoescape=select_autoescape(['html', 'xml']),
+                                                            bytecode_cache=FileSystemBytecodeCache())
+        return env
 
     def get_context_data(self, **options) -> dict:
         project_dir = options['project_dir']
@@ -322,9 +343,13 @@ class TerraformCloud:
 @click.option('--key', '-k', help="Sources zip file bucket's name.")
 @click.option('--module-name', '-m', multiple=True, help="Python module added from current pyenv (module or file.py).")
 @click.option('--profile-name', '-pn', required=True, help="AWS credential profile.")
+@click.option('--routes/--no-routes', default=True, help="Add the routes snapshot file in the zip file.")
 # Deploy specific optionsElle est immédiatement opérationnelle et fonctionnell
-@click.option('--binary-media-types')
+@click.option('--authorizer-ttl', default=0, help="API Gateway authorizer result cache time to live (in seconds).")
+@click.option('--binary-media-types', type=ListParamType(), default=[],
+              help="Binary media types added to the API ones (comma separated).")
 @click.option('--cloud', is_flag=True, help="Use cloud workspaces.")
+@click.option('--compression-size', type=int, help="API Gateway minimum compression size (no compression if not set).")
 @click.option('--layers', '-l', multiple=True, help="Add layer (full arn: aws:lambda:...)")
 @click.option('--memory-size', default=128)
 @click.option('--output', '-o', is_flag=True, help="Print terraform output values.")
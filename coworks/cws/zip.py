@@ -13,6 +13,7 @@ from shutil import copyfile, copytree, ignore_patterns, make_archive
 
 from .utils import progressbar
 from .. import aws
+from ..config import ROUTES_FILE_NAME
 
 
 @click.command("zip", short_help="Zip all source files to create a Lambda file source.")
@@ -23,12 +24,14 @@ from .. import aws
 @click.option('--key', '-k', help="Sources zip file bucket's name.")
 @click.option('--module_name', '-m', multiple=True, help="Python module added from current pyenv (module or file.py).")
 @click.option('--profile_name', '-p', required=True, help="AWS credential profile.")
+@click.option('--routes/--no-routes', default=True, help="Add the routes snapshot file in the zip file.")
 @click.pass_context
 @pass_script_info
-def zip_command(info, ctx, bucket, dry, hash, ignore, module_name, key, profile_name) -> None:
+def zip_command(info, ctx, bucket, dry, hash, ignore, module_name, key, profile_name, routes) -> None:
     """
     This command uploads project source folder as a zip file on a S3 bucket.
     Uploads also the hash code of this file to be able to determined code changes (used by terraform as a trigger).
+    Adds also the routes snapshot file to avoid routes discovery at Lambda cold start.
     """
     debug = ctx.find_root().params['debug']
     aws_s3_session = aws.AwsS3Session(profile_name=profile_name)
@@ -73,6 +76,8 @@ def zip_command(info, ctx, bucket, dry, hash, ignore, module_name, key, profile_
                     mod = importlib.import_module(name)
                     module_path = Path(mod.__file__).resolve().parent
                     copytree(module_path, str(tmp_path / f'filtered_dir/{name}'), ignore=full_ignore_patterns())
+            if routes:
+                info.load_app().write_routes_file(tmp_path / 'filtered_dir' / ROUTES_FILE_NAME)
             module_archive = make_archive(str(tmp_path / 'sources'), 'zip', str(tmp_path / 'filtered_dir'))
             bar.update(msg=f"Sources is {int(os.path.getsize(module_archive) / 1000)} Kb" if debug else "")
 
@@ -1,17 +1,32 @@
+import asyncio
+import binascii
+import gzip
 import importlib
+import importlib.util
 import inspect
+import io
 import os
 import platform
 import sys
+import threading
+import time
 import traceback
+import typing as t
+from collections import OrderedDict
+from dataclasses import dataclass
+from dataclasses import field
+from functools import lru_cache
 from functools import partial
 from functools import update_wrapper
 
+from flask import current_app
 from flask import make_response
 from flask.blueprints import BlueprintSetupState
 from werkzeug.datastructures import Headers
 from werkzeug.exceptions import BadRequest
 from werkzeug.exceptions import BadRequestKeyError
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import quote_etag
 
 from .globals import request
 from .wrappers import ApiResponse
@@ -19,17 +34,49 @@ from .wrappers import ApiResponse
 HTTP_METHODS = ['GET', 'POST', 'PUT', 'DELETE', 'PATCH', 'OPTIONS']
 
 
-def add_coworks_routes(app, bp_state: BlueprintSetupState = None) -> None:
-    """ Creates all routes for a microservice.
+@dataclass
+class RouteEntry:
+    """A route entry is the resolved description of an entry function registered as route.
+    It contains only serializable values so routes may be created again without reflection."""
+
+    rule: str
+    method: str
+    endpoint: str
+    function: str
+    blueprint: t.Optional[str] = None
+    args: t.List[str] = field(default_factory=list)
+    kwarg_keys: t.List[str] = field(default_factory=list)
+    varkw: t.Optional[str] = None
+    binary: bool = False
+    content_type: t.Optional[str] = None
+    no_auth: bool = False
+
+
+@lru_cache(maxsize=None)
+def get_entry_functions(cls) -> t.Tuple[t.Tuple[str, t.Callable], ...]:
+    """Returns the entry functions (name and function) defined in the class (cached)."""
+    method_members = inspect.getmembers(cls, lambda x: inspect.isfunction(x))
+    return tuple((name, fun) for name, fun in method_members if hasattr(fun, '__CWS_METHOD'))
+
+
+@lru_cache(maxsize=None)
+def get_entry_signature(fun) -> t.Tuple[t.List[str], t.List[str], t.Optional[str]]:
+    """Returns the positional, keyword and variable keyword parameters names of an entry function (cached)."""
+    spec = inspect.getfullargspec(fun)
+    args = spec.args[1:]
+    len_defaults = len(spec.defaults) if spec.defaults else 0
+    len_positional = len(args) - len_defaults
+    return args[:len_positional], args[len_positional:], spec.varkw
+
+
+def create_route_entries(app, bp_state: BlueprintSetupState = None) -> t.List[RouteEntry]:
+    """ Creates all route entries for a microservice.
     :param app the app microservice
     :param bp_state the blueprint state
     """
-
-    # Adds entrypoints
     scaffold = bp_state.blueprint if bp_state else app
-    method_members = inspect.getmembers(scaffold.__class__, lambda x: inspect.isfunction(x))
-    methods = [fun for _, fun in method_members if hasattr(fun, '__CWS_METHOD')]
-    for fun in methods:
+    route_entries = []
+    for name, fun in get_entry_functions(scaffold.__class__):
         if getattr(fun, '__CWS_HIDDEN', False):
             continue
 
@@ -37,113 +84,90 @@ def add_coworks_routes(app, bp_state: BlueprintSetupState = None) -> None:
         entry_path = path_join(getattr(fun, '__CWS_PATH'))
 
         # Get parameters
-        args = inspect.getfullargspec(fun).args[1:]
-        defaults = inspect.getfullargspec(fun).defaults
-        varkw = inspect.getfullargspec(fun).varkw
-        if defaults:
-            len_defaults = len(defaults)
-            for index, arg in enumerate(args[:-len_defaults]):
-                entry_path = path_join(entry_path, f"/<{arg}>")
-            kwarg_keys = args[-len_defaults:]
-        else:
-            for index, arg in enumerate(args):
-                entry_path = path_join(entry_path, f"/<{arg}>")
-            kwarg_keys = {}
-
-        proxy = create_rest_proxy(scaffold, fun, kwarg_keys, args, varkw)
-        proxy.__CWS_BINARY = getattr(fun, '__CWS_BINARY', False)
-        proxy.__CWS_CONTENT_TYPE = getattr(fun, '__CWS_CONTENT_TYPE')
-        proxy.__CWS_NO_AUTH = getattr(fun, '__CWS_NO_AUTH')
-        proxy.__CWS_FROM_BLUEPRINT = bool(bp_state)
+        positional, kwarg_keys, varkw = get_entry_signature(fun)
+        for arg in positional:
+            entry_path = path_join(entry_path, f"/<{arg}>")
 
         # Creates the entry
         url_prefix = bp_state.url_prefix if bp_state else ''
         rule = make_absolute(entry_path, url_prefix)
 
         name_prefix = f"{bp_state.blueprint.name}_" if bp_state else ''
-        endpoint = f"{name_prefix}{proxy.__name__}"
+        endpoint = f"{name_prefix}{fun.__name__}"
+
+        route_entries.append(RouteEntry(
+            rule=rule, method=method, endpoint=endpoint, function=name,
+            blueprint=bp_state.name if bp_state else None,
+            args=[*positional, *kwarg_keys], kwarg_keys=[*kwarg_keys], varkw=varkw,
+            binary=getattr(fun, '__CWS_BINARY', False),
+            content_type=getattr(fun, '__CWS_CONTENT_TYPE'),
+            no_auth=getattr(fun, '__CWS_NO_AUTH'),
+        ))
+
+    return route_entries
+
+
+def add_route_entry(app, route_entry: RouteEntry) -> None:
+    """ Adds the route defined by the route entry to the microservice.
+    :param app the app microservice
+    :param route_entry the route entry
+    """
+    scaffold = app.blueprints[route_entry.blueprint] if route_entry.blueprint else app
+    fun = getattr(scaffold.__class__, route_entry.function)
+
+    proxy = create_rest_proxy(scaffold, fun, route_entry.kwarg_keys, route_entry.args, route_entry.varkw)
+    proxy.__CWS_BINARY = route_entry.binary
+    proxy.__CWS_CONTENT_TYPE = route_entry.content_type
+    proxy.__CWS_NO_AUTH = route_entry.no_auth
+    proxy.__CWS_FROM_BLUEPRINT = bool(route_entry.blueprint)
+    proxy.__CWS_BLUEPRINT = route_entry.blueprint
 
-        app.add_url_rule(rule=rule, view_func=proxy, methods=[method], endpoint=endpoint)
+    app.add_url_rule(rule=route_entry.rule, view_func=proxy, methods=[route_entry.method],
+                     endpoint=route_entry.endpoint)
+    app.route_entries.append(route_entry)
+
+
+def add_coworks_routes(app, bp_state: BlueprintSetupState = None) -> None:
+    """ Creates all routes for a microservice.
+    :param app the app microservice
+    :param bp_state the blueprint state
+    """
+    for route_entry in create_route_entries(app, bp_state):
+        add_route_entry(app, route_entry)
 
 
 def create_rest_proxy(scaffold, func, kwarg_keys, args, varkw):
+    bind = create_binder(scaffold, kwarg_keys, args, varkw)
+    content_type = getattr(func, '__CWS_CONTENT_TYPE')
+    is_coroutine = inspect.iscoroutinefunction(func)
+    cache = getattr(func, '__CWS_CACHE', None)
+    version = getattr(func, '__CWS_ETAG', None)
+    version = version if callable(version) else None
+
+    def view(kwargs):
+        resp = run_coroutine(func(scaffold, **kwargs)) if is_coroutine else func(scaffold, **kwargs)
+        if resp is None:
+            return "", 204
+
+        if content_type:
+            return resp, 200, {'content-type': content_type}
+
+        return make_response(resp)
+
     def proxy(**kwargs):
         try:
-            # Adds kwargs parameters
-            def check_param_expected_in_lambda(param_name):
-                """Alerts when more parameters than expected are defined in request."""
-                if param_name not in kwarg_keys and varkw is None:
-                    _err_msg = f"TypeError: got an unexpected keyword argument '{param_name}'"
-                    raise BadRequestKeyError(_err_msg)
-
-            def as_fun_params(values: dict, flat=True):
-                """Set parameters as simple value or list of values if multiple defined.
-               :param values: Dict of values.
-               :param flat: If set to True the list values of lenth 1 is retrun as single value.
-                """
-                params = {}
-                for k, v in values.items():
-                    check_param_expected_in_lambda(k)
-                    params[k] = v[0] if flat and len(v) == 1 else v
-                return params
-
-            # get keyword arguments from request
-            if kwarg_keys or varkw:
-
-                # adds parameters from query parameters
-                if request.method == 'GET':
-                    data = request.values.to_dict(False)
-                    kwargs = dict(**kwargs, **as_fun_params(data))
-
-                # adds parameters from body parameter
-                elif request.method in ['POST', 'PUT']:
-                    try:
-                        if request.is_json:
-                            data = request.get_data()
-                            if not data:
-                                kwargs[kwarg_keys[0]] = {}
-                            else:
-                                data = request.json
-                                if type(data) is dict:
-                                    kwargs = dict(**kwargs, **as_fun_params(data, False))
-                                else:
-                                    kwargs[kwarg_keys[0]] = data
-                        elif request.is_multipart:
-                            data = request.form.to_dict(False)
-                            files = request.files.to_dict(False)
-                            kwargs = dict(**kwargs, **as_fun_params(data), **as_fun_params(files))
-                        elif request.is_form_urlencoded:
-                            data = request.form.to_dict(False)
-                            kwargs = dict(**kwargs, **as_fun_params(data))
-                        else:
-                            data = request.values.to_dict(False)
-                            kwargs = dict(**kwargs, **as_fun_params(data))
-                    except Exception as e:
-                        scaffold.logger.error(traceback.print_exc())
-                        scaffold.logger.debug(e)
-                        raise BadRequest(str(e))
-
-                else:
-                    err_msg = f"Keyword arguments are not permitted for {request.method} method."
-                    raise BadRequestKeyError(err_msg)
-
-            else:
-                if not args:
-                    if request.content_length:
-                        err_msg = f"TypeError: got an unexpected arguments (body: {request.json})"
-                        raise BadRequestKeyError(err_msg)
-                    if request.query_string:
-                        err_msg = f"TypeError: got an unexpected arguments (query: {request.query_string})"
-                        raise BadRequestKeyError(err_msg)
-
-            resp = func(scaffold, **kwargs)
-            if resp is None:
-                return "", 204
-
-            if getattr(func, '__CWS_CONTENT_TYPE'):
-                return resp, 200, {'content-type': getattr(func, '__CWS_CONTENT_TYPE')}
-
-            return make_response(resp)
+            bind(kwargs)
+
+            # the entry is not called if the version key matches
+            if version and request.method == 'GET':
+                etag = str(version(scaffold, **kwargs))
+                if request.if_none_match.contains_weak(etag):
+                    return current_app.response_class(status=304, headers={'ETag': quote_etag(etag)})
+                resp = current_app.make_response(view(kwargs))
+                resp.set_etag(etag)
+                return resp
+
+            return view(kwargs)
         except TypeError as e:
             scaffold.logger.error(f"Bad request error: {str(e)}")
             raise BadRequest(str(e))
@@ -151,7 +175,122 @@ def create_rest_proxy(scaffold, func, kwarg_keys, args, varkw):
             scaffold.logger.error(e)
             raise
 
-    return update_wrapper(proxy, func)
+    def cached_proxy(**kwargs):
+        if request.method != 'GET':
+            return proxy(**kwargs)
+
+        app = current_app._get_current_object()
+        key = cache.key(app, request.path, request.args, request.headers)
+        resp = cache.get(app, key)
+        if resp is None:
+            resp = app.make_response(proxy(**kwargs))
+            cache.set(key, resp)
+        return resp
+
+    return update_wrapper(cached_proxy if cache else proxy, func)
+
+
+_event_loops = threading.local()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Returns the event loop of the current thread, created once and reused on warm invocations.
+    Should only be used in the main thread as the loops of the other threads are never closed."""
+    loop = getattr(_event_loops, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = _event_loops.loop = asyncio.new_event_loop()
+    return loop
+
+
+def run_coroutine(coro: t.Coroutine) -> t.Any:
+    """Runs the coroutine until completed on the event loop of the main thread (reused on warm invocations).
+    In the other threads (batch workers, threaded server), the coroutine is run on a new loop closed at the end."""
+    if threading.current_thread() is threading.main_thread():
+        return get_event_loop().run_until_complete(coro)
+    return asyncio.run(coro)
+
+
+def create_binder(scaffold, kwarg_keys, args, varkw) -> t.Callable[[dict], None]:
+    """Compiles, for an entry function, the binder adding the request parameters to the keyword arguments.
+    :param scaffold: the app or blueprint of the entry.
+    :param kwarg_keys: the keyword parameters names of the entry.
+    :param args: the positional parameters names of the entry.
+    :param varkw: the name of the variable keyword parameter if defined.
+    """
+    allowed_keys = frozenset(kwarg_keys)
+    any_key = varkw is not None
+    body_key = kwarg_keys[0] if kwarg_keys else None
+
+    def add(kwargs: dict, items: t.Iterable[t.Tuple[str, t.Any]], flat=True):
+        """Adds parameters as simple value or list of values if multiple defined.
+        :param kwargs: Keyword arguments completed.
+        :param items: Iterable on (key, values).
+        :param flat: If set to True the list values of length 1 is set as single value.
+        """
+        for k, v in items:
+            if not any_key and k not in allowed_keys:
+                raise BadRequestKeyError(f"TypeError: got an unexpected keyword argument '{k}'")
+            if k in kwargs:
+                raise TypeError(f"got multiple values for keyword argument '{k}'")
+            kwargs[k] = v[0] if flat and len(v) == 1 else v
+
+    def bind_body(kwargs: dict):
+        mt = request.mimetype
+        if is_json(mt):
+            if not request.get_data():
+                if body_key:
+                    kwargs[body_key] = {}
+                return
+            data = request.json
+            if type(data) is dict:
+                add(kwargs, data.items(), flat=False)
+            elif body_key:
+                kwargs[body_key] = data
+            else:
+                raise BadRequest(f"TypeError: got an unexpected arguments (body: {data})")
+        elif mt == "multipart/form-data":
+            add(kwargs, request.form.lists())
+            add(kwargs, request.files.lists())
+        elif mt == "application/x-www-form-urlencoded":
+            add(kwargs, request.form.lists())
+        else:
+            add(kwargs, request.values.lists())
+
+    def bind_kwargs(kwargs: dict):
+        method = request.method
+
+        # adds parameters from query parameters
+        if method == 'GET':
+            add(kwargs, request.values.lists())
+
+        # adds parameters from body parameter
+        elif method in ['POST', 'PUT']:
+            try:
+                bind_body(kwargs)
+            except HTTPException:
+                raise
+            except Exception as e:
+                scaffold.logger.error(traceback.print_exc())
+                scaffold.logger.debug(e)
+                raise BadRequest(str(e))
+
+        else:
+            err_msg = f"Keyword arguments are not permitted for {method} method."
+            raise BadRequestKeyError(err_msg)
+
+    def bind_no_kwargs(kwargs: dict):
+        if request.content_length:
+            err_msg = f"TypeError: got an unexpected arguments (body: {request.json})"
+            raise BadRequestKeyError(err_msg)
+        if request.query_string:
+            err_msg = f"TypeError: got an unexpected arguments (query: {request.query_string})"
+            raise BadRequestKeyError(err_msg)
+
+    if kwarg_keys or any_key:
+        return bind_kwargs
+    if not args:
+        return bind_no_kwargs
+    return lambda kwargs: None
 
 
 def import_attr(module, attr: str, cwd='.'):
@@ -217,6 +356,189 @@ def trim_underscores(name):
     return name
 
 
+COMPRESSION_ENCODINGS = ('br', 'gzip') if importlib.util.find_spec('brotli') else ('gzip',)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compresses the data with the content encoding (brotli is an optional dependency)."""
+    if encoding == 'br':
+        import brotli
+
+        return brotli.compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def is_json(mt):
+    """Checks if the mimetype is a JSON one."""
+    return (
+            mt == "application/json"
+            or type(mt) is str
+            and mt.startswith("application/")
+            and mt.endswith("+json")
+    )
+
+
+JSON_NATIVE_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+def is_json_native(value) -> bool:
+    """Checks if the value contains only JSON types (so can be serialized by the standard json module).
+    Subclasses of the JSON types are not considered as native."""
+    native = JSON_NATIVE_TYPES
+    containers = [value]
+    while containers:
+        container = containers.pop()
+        if type(container) is dict:
+            if not all(type(key) is str for key in container):
+                return False
+            values = container.values()
+        elif type(container) in (list, tuple):
+            values = container
+        else:
+            if type(container) not in native:
+                return False
+            continue
+        for item in values:
+            item_type = type(item)
+            if item_type in native:
+                continue
+            if item_type is dict or item_type is list or item_type is tuple:
+                containers.append(item)
+            else:
+                return False
+    return True
+
+
+class Base64DecodeStream(io.BufferedReader):
+    """Readable stream decoding a base64 string by chunks, the decoded data being never stored as a whole."""
+
+    class _Raw(io.RawIOBase):
+
+        def __init__(self, data: str):
+            self.data = data
+            self.pos = 0
+            self.pending = b''
+
+        def readable(self) -> bool:
+            return True
+
+        def readinto(self, b) -> int:
+            if not self.pending:
+                size = max(len(b) // 3, 1) * 4
+                chunk = self.data[self.pos:self.pos + size]
+                if not chunk:
+                    return 0
+                self.pos += len(chunk)
+                self.pending = binascii.a2b_base64(chunk)
+            n = min(len(b), len(self.pending))
+            b[:n] = self.pending[:n]
+            self.pending = self.pending[n:]
+            return n
+
+    def __init__(self, data: str, buffer_size: int = 64 * 1024):
+        super().__init__(self._Raw(data), buffer_size)
+
+
+def base64_size(size: int) -> int:
+    """Returns the size of the base64 encoded value of data of the given size."""
+    return 4 * ((size + 2) // 3)
+
+
+def base64_encode_chunks(chunks: t.Iterable[bytes], size: int = None, max_size: int = None) -> str:
+    """Base64 encodes chunks of bytes without joining them first.
+    :param chunks: the bytes chunks.
+    :param size: the total size of the chunks if known (to preallocate the encoded buffer).
+    :param max_size: raises ValueError if the encoded value is greater than this size.
+    """
+    if size is not None and max_size is not None and base64_size(size) > max_size:
+        raise ValueError(f"Encoded payload size {base64_size(size)} exceeds the limit of {max_size} bytes.")
+
+    encoded = bytearray(base64_size(size)) if size is not None else bytearray()
+    pos = 0
+
+    def add(data):
+        nonlocal pos
+        value = binascii.b2a_base64(data, newline=False)
+        end = pos + len(value)
+        if max_size is not None and end > max_size:
+            raise ValueError(f"Encoded payload size exceeds the limit of {max_size} bytes.")
+        encoded[pos:end] = value
+        pos = end
+
+    # encodes only 3 bytes blocks and keeps the remaining bytes for the next chunk
+    remaining = b''
+    for chunk in chunks:
+        view = memoryview(chunk)
+        if remaining:
+            needed = 3 - len(remaining)
+            remaining += bytes(view[:needed])
+            view = view[needed:]
+            if len(remaining) < 3:
+                continue
+            add(remaining)
+        length = len(view) - len(view) % 3
+        if length:
+            add(view[:length])
+        remaining = bytes(view[length:])
+    if remaining:
+        add(remaining)
+
+    del encoded[pos:]
+    return encoded.decode('ascii')
+
+
+class LRUCache:
+    """Least recently used cache with optional time to live for its values.
+    Defined at module level, it is kept across warm Lambda invocations."""
+
+    def __init__(self, maxsize: int = 128, ttl: t.Optional[float] = None):
+        """
+        :param maxsize: maximum number of values kept.
+        :param ttl: time to live in seconds of the values (no expiry if None).
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._values: OrderedDict = OrderedDict()
+
+    def get(self, key, default=None):
+        """Returns the value if defined and not expired, the default value otherwise."""
+        try:
+            expiry, value = self._values[key]
+        except KeyError:
+            return default
+        if expiry is not None and expiry < time.monotonic():
+            del self._values[key]
+            return default
+        self._values.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: t.Optional[float] = None) -> None:
+        """Sets the value, removing the least recently used one if the maximum size is reached.
+        :param ttl: time to live of this value if different of the cache one.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        self._values[key] = (time.monotonic() + ttl if ttl is not None else None, value)
+        self._values.move_to_end(key)
+        while len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Removes the value and returns it."""
+        value = self.get(key, default)
+        self._values.pop(key, None)
+        return value
+
+    def clear(self) -> None:
+        self._values.clear()
+
+    def __contains__(self, key) -> bool:
+        sentinel = object()
+        return self.get(key, sentinel) is not sentinel
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
 def as_list(var):
     if var is None:
         return []
@@ -1,15 +1,38 @@
 import typing as t
+from tempfile import SpooledTemporaryFile
+
 from flask import Request as FlaskRequest
+from flask import current_app
 from flask import Response as FlaskResponse
 
 
 class TokenResponse:
     """AWS authorization response."""
 
-    def __init__(self, allow: bool, arn: str):
-        """Value may be string when allowed only if match workspace label."""
+    def __init__(self, allow: t.Union[bool, str], arn: str, wildcard: bool = False):
+        """Value may be string when allowed only if match workspace label.
+        :param allow: the authorizer decision.
+        :param arn: the method ARN called.
+        :param wildcard: if True, the policy covers all the methods and resources of the stage (allowing
+        API Gateway authorizer cache to be used for all routes).
+        """
         self.allow = allow
         self.arn = arn
+        self.wildcard = wildcard
+
+    @property
+    def resource(self) -> str:
+        """Returns the resource of the policy.
+        The method ARN has the form: arn:aws:execute-api:region:account:api_id/stage/method/resource_path.
+        """
+        if not self.wildcard and type(self.allow) is not str:
+            return self.arn
+
+        arn_prefix, _, path = self.arn.partition('/')
+        stage = path.split('/')[0]
+        if type(self.allow) is str:
+            stage = self.allow
+        return f"{arn_prefix}/{stage}/*" if self.wildcard else f"{arn_prefix}/{stage}/{path.partition('/')[2]}"
 
     @property
     def json(self) -> t.Optional[t.Any]:
@@ -21,7 +44,7 @@ class TokenResponse:
                     {
                         "Action": "execute-api:Invoke",
                         "Effect": "Allow" if self.allow else "Deny",
-                        "Resource": self.arn
+                        "Resource": self.resource
                     }
                 ]
             }
@@ -29,8 +52,46 @@ class TokenResponse:
 
 
 class ApiResponse(FlaskResponse):
-    """Default mimetype is redefined."""
+    """Default mimetype is redefined.
+
+    The JSON value is the value of the body. It is serialized only when the body is needed (WSGI response, ETag,
+    cache, ...) so it may be returned as is, without being serialized, as Lambda response.
+    """
     default_mimetype = "application/json"
+    json_value = None
+    _json_dumps: t.Optional[t.Callable[[t.Any], t.Union[str, bytes]]] = None
+
+    def set_json(self, value: t.Any, dumps: t.Callable[[t.Any], t.Union[str, bytes]]) -> None:
+        """Defines the JSON value of the body, serialized by dumps when the body is needed."""
+        self.response = []
+        self.headers.pop('Content-Length', None)
+        self.json_value = value
+        self._json_dumps = dumps
+
+    @property
+    def response(self) -> t.Any:
+        """Response iterable, the JSON value being serialized at first access."""
+        if self._json_dumps is not None:
+            dumps, value = self._json_dumps, self.json_value
+            self.set_data(dumps(value))
+            self.json_value = value
+        return self.__dict__.get('response')
+
+    @response.setter
+    def response(self, value: t.Any) -> None:
+        # Stored in the instance dictionary as a response may be converted by changing its class (force_type).
+        self._json_dumps = None
+        self.__dict__['response'] = value
+
+    @property
+    def json_pending(self) -> bool:
+        """True if the JSON value has not been serialized yet."""
+        return self._json_dumps is not None
+
+    def set_data(self, value: t.Union[bytes, str]) -> None:
+        """Redefined as the JSON value doesn't correspond anymore to the data."""
+        super().set_data(value)
+        self.json_value = None
 
 
 class Request(FlaskRequest):
@@ -44,6 +105,26 @@ class Request(FlaskRequest):
         """Defined as a property to be read only."""
         return self._in_lambda_context
 
+    @property
+    def max_content_length(self) -> t.Optional[int]:
+        """Maximum content length of the entry called if defined, of the microservice otherwise."""
+        value = self._entry_option('__CWS_MAX_CONTENT_LENGTH')
+        return value if value is not None else super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        """Uploaded files are kept in memory up to the maximum memory size of the entry (or of the microservice),
+        then in a temporary file."""
+        max_size = self._entry_option('__CWS_MAX_MEMORY_SIZE')
+        if max_size is None:
+            max_size = current_app.config['CWS_UPLOAD_MEMORY_SIZE']
+        return SpooledTemporaryFile(max_size=max_size)
+
+    def _entry_option(self, name: str) -> t.Any:
+        if self.url_rule is None or not current_app:
+            return None
+        view_function = current_app.view_functions.get(self.url_rule.endpoint)
+        return getattr(view_function, name, None)
+
     @property
     def is_multipart(self) -> bool:
         """Check if the mimetype indicates form-data.
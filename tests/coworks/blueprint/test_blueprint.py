@@ -1,3 +1,9 @@
+import os
+from unittest.mock import patch
+
+import pytest
+
+from coworks.config import ROUTES_FILE_NAME
 from tests.coworks.blueprint.blueprint import BP, InitBP
 from tests.coworks.ms import SimpleMS
 
@@ -40,3 +46,79 @@ class TestClass:
             init_bp.do_before_first_activation.assert_called_once()
             init_bp.do_before_activation.assert_called_once()
             init_bp.do_after_activation.assert_called_once()
+
+    def test_routes_snapshot(self):
+        app = SimpleMS()
+        app.register_blueprint(BP(), url_prefix="/prefix")
+        snapshot = app.routes_snapshot()
+        assert {'rule': '/prefix/test/<index>', 'method': 'GET', 'endpoint': 'bp_get_test', 'function': 'get_test',
+                'blueprint': 'bp', 'args': ['index'], 'kwarg_keys': [], 'varkw': None, 'binary': False,
+                'content_type': None, 'no_auth': False} in snapshot
+
+        loaded = SimpleMS()
+        loaded.register_blueprint(BP(), url_prefix="/prefix")
+        loaded.load_route_entries(snapshot)
+        with patch('coworks.utils.create_route_entries') as create_route_entries:
+            with loaded.test_client() as c:
+                response = c.get('/prefix/test/3', headers={'Authorization': 'token'})
+                assert response.status_code == 200
+                assert response.get_data(as_text=True) == "blueprint BP 3"
+                response = c.get('/content/3', headers={'Authorization': 'token'})
+                assert response.status_code == 200
+                assert response.get_data(as_text=True) == "get content with 3"
+            create_route_entries.assert_not_called()
+        assert sorted(loaded.routes) == sorted(app.routes)
+
+    def test_routes_file(self, tmp_path):
+        app = SimpleMS()
+        app.register_blueprint(BP(), url_prefix="/prefix")
+        app.write_routes_file(tmp_path / ROUTES_FILE_NAME)
+
+        loaded = SimpleMS()
+        loaded.register_blueprint(BP(), url_prefix="/prefix")
+        with patch.dict(os.environ, {'LAMBDA_TASK_ROOT': str(tmp_path)}):
+            with patch('coworks.utils.create_route_entries') as create_route_entries:
+                with loaded.app_context():
+                    create_route_entries.assert_not_called()
+        assert sorted(loaded.routes) == sorted(app.routes)
+
+    def test_stale_routes_file(self, tmp_path):
+        app = SimpleMS()
+        app.write_routes_file(tmp_path / ROUTES_FILE_NAME)
+        routes_file = tmp_path / ROUTES_FILE_NAME
+        routes_file.write_text(routes_file.read_text().replace('"hash": "', '"hash": "stale'))
+
+        loaded = SimpleMS()
+        loaded.register_blueprint(BP(), url_prefix="/prefix")
+        with patch.dict(os.environ, {'LAMBDA_TASK_ROOT': str(tmp_path)}):
+            with loaded.test_client() as c:
+                response = c.get('/prefix/test/3', headers={'Authorization': 'token'})
+                assert response.status_code == 200
+                assert response.get_data(as_text=True) == "blueprint BP 3"
+
+    def test_lazy(self):
+        app = SimpleMS()
+        app.debug = True
+        init_bp = InitBP()
+        app.register_blueprint(init_bp, url_prefix="/prefix", lazy=True)
+        with app.test_client() as c:
+            response = c.get('/', headers={'Authorization': 'token'})
+            assert response.status_code == 200
+            assert '/prefix/test/<index>' not in app.routes
+            init_bp.do_before_first_activation.assert_not_called()
+            response = c.get('/prefix/test/3', headers={'Authorization': 'token'})
+            assert response.status_code == 200
+            assert response.get_data(as_text=True) == "blueprint BP 3"
+            assert '/prefix/test/<index>' in app.routes
+            init_bp.do_before_first_activation.assert_called_once()
+            response = c.get('/prefix/extended/test/3', headers={'Authorization': 'token'})
+            assert response.status_code == 200
+            init_bp.do_before_first_activation.assert_called_once()
+
+        snapshot = app.routes_snapshot()
+        assert len([r for r in snapshot if r['blueprint'] == 'initbp']) == 2
+
+    def test_lazy_without_prefix(self):
+        app = SimpleMS()
+        with pytest.raises(ValueError):
+            app.register_blueprint(BP(), lazy=True)
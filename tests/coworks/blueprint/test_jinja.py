@@ -1,4 +1,5 @@
 from io import BytesIO
+from unittest.mock import patch
 
 from coworks import TechMicroService
 from coworks.blueprint.jinja_blueprint import Jinja
@@ -49,3 +50,37 @@ class TestClass:
 
             assert response.status_code == 200
             assert response.get_data(as_text=True) == "hello world"
+
+    def test_compiled_template_cache(self, auth_headers):
+        app = JinjaMS()
+        jinja = app.blueprints['jinja']
+        with app.test_client() as c:
+            with patch.object(jinja.environment, 'compile', wraps=jinja.environment.compile) as compile:
+                for name in ("world", "other"):
+                    data = {'template': "hello {{ world_name }}", 'world_name': name}
+                    response = c.post('/render', json=data, headers=auth_headers)
+                    assert response.get_data(as_text=True) == f"hello {name}"
+                compile.assert_called_once()
+
+    def test_named_template(self, auth_headers):
+        app = JinjaMS()
+        jinja = app.blueprints['jinja']
+        jinja.register_template('hello', "hello {{ world_name }}")
+        with app.test_client() as c:
+            response = c.post('/render/hello', json={'world_name': 'world'}, headers=auth_headers)
+            assert response.status_code == 200
+            assert response.get_data(as_text=True) == "hello world"
+            jinja.register_template('hello', "bye {{ world_name }}")
+            response = c.post('/render/hello', json={'world_name': 'world'}, headers=auth_headers)
+            assert response.get_data(as_text=True) == "bye world"
+            response = c.post('/render/unknown', json={'world_name': 'world'}, headers=auth_headers)
+            assert response.status_code == 404
+
+    def test_bytecode_cache(self, auth_headers, tmp_path):
+        app = TechMicroService('jinja', configs=LocalConfig())
+        app.register_blueprint(Jinja(bytecode_cache=str(tmp_path)))
+        with app.test_client() as c:
+            data = {'template': "hello {{ world_name }}", 'world_name': "world"}
+            response = c.post('/render', json=data, headers=auth_headers)
+            assert response.get_data(as_text=True) == "hello world"
+            assert len(list(tmp_path.iterdir())) == 1
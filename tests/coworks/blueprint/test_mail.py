@@ -8,11 +8,13 @@ import pytest
 
 from coworks import TechMicroService
 from coworks.blueprint.mail_blueprint import Mail
+from coworks.blueprint.mail_blueprint import MessageError
 from coworks.config import LocalConfig
 
 smtp_mock = mock.MagicMock()
-smtp_mock.return_value.__enter__.return_value.login = login_mock = mock.Mock()
-smtp_mock.return_value.__enter__.return_value.send_message = send_mock = mock.Mock()
+smtp_mock.return_value.__enter__.return_value = smtp_mock.return_value
+smtp_mock.return_value.login = login_mock = mock.Mock()
+smtp_mock.return_value.send_message = send_mock = mock.Mock()
 
 email_mock = mock.MagicMock()
 email_mock.return_value.add_attachment = add_mock = mock.Mock()
@@ -112,3 +114,118 @@ class TestClass:
             assert response.status_code == 200
             login_mock.assert_called_with('myself@test.com', 'passwd')
             add_mock.assert_called_once()
+
+    @mock.patch.dict(os.environ, {
+        "SMTP_SERVER": "mail.test.com:587",
+        "SMTP_LOGIN": "myself@test.com",
+        "SMTP_PASSWD": "passwd"
+    })
+    def test_send_batch(self, auth_headers):
+        smtp = mock.MagicMock()
+        smtp.return_value.noop.return_value = (250, b'OK')
+        smtp.return_value.send_message.side_effect = [None, smtplib.SMTPRecipientsRefused({}), None]
+        app = MailMS(env_var_prefix='SMTP')
+        with mock.patch.object(smtplib, 'SMTP', smtp), app.test_client() as c:
+            messages = [
+                {'subject': "Test", 'from_addr': "from@test.fr", 'to_addrs': "to1@test.fr"},
+                {'subject': "Test", 'from_addr': "from@test.fr", 'to_addrs': "to2@test.fr"},
+                {'subject': "Test", 'from_addr': "from@test.fr"},
+                {'subject': "Test", 'from_addr': "from@test.fr", 'to_addrs': ["to3@test.fr", "to4@test.fr"]},
+            ]
+            response = c.post('/send/batch', json={'messages': messages}, headers=auth_headers)
+            assert response.status_code == 200
+            assert [r['status'] for r in response.json] == [200, 400, 400, 200]
+            assert response.json[2]['message'] == "To addresses not defined (to_addrs:[str])"
+            assert response.json[3]['message'] == "Mail sent to to3@test.fr, to4@test.fr"
+            smtp.assert_called_once()
+            smtp.return_value.login.assert_called_once_with('myself@test.com', 'passwd')
+
+            # connection kept between calls
+            smtp.return_value.send_message.side_effect = None
+            response = c.post('/send/batch', json={'messages': messages[:1]}, headers=auth_headers)
+            assert response.status_code == 200
+            smtp.assert_called_once()
+            smtp.return_value.noop.assert_called()
+
+            # reconnection if lost
+            smtp.return_value.noop.side_effect = smtplib.SMTPServerDisconnected()
+            response = c.post('/send', json=messages[0], headers=auth_headers)
+            assert response.status_code == 200
+            assert smtp.call_count == 2
+
+
+class AttachmentResponse:
+
+    def __init__(self, content: bytes, status_code: int = 200, content_type: str = 'application/pdf'):
+        self.status_code = status_code
+        self.headers = {'Content-Type': content_type, 'Content-Length': str(len(content))}
+        self.content = content
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class TestAttachmentClass:
+
+    def test_download_attachments(self):
+        mail = Mail()
+        urls = {f"file{i}.pdf": f"https://test.com/file{i}" for i in range(5)}
+        contents = {url: AttachmentResponse(url.encode() * 1000) for url in urls.values()}
+        with mock.patch('requests.Session.get', side_effect=lambda url, **kwargs: contents[url]) as get:
+            attachments = mail.download_attachments(urls)
+        assert [name for name, _ in attachments] == list(urls)
+        assert attachments[3][1] == (b"https://test.com/file3" * 1000, 'application/pdf')
+        assert get.call_count == 5
+        assert get.call_args.kwargs == {'stream': True, 'timeout': 10}
+
+    def test_download_errors(self):
+        mail = Mail(attachment_max_size=1000)
+        urls = {'small.pdf': "https://test.com/small", 'big.pdf': "https://test.com/big"}
+        contents = {"https://test.com/small": AttachmentResponse(b"x" * 600),
+                    "https://test.com/big": AttachmentResponse(b"x" * 600)}
+        with mock.patch('requests.Session.get', side_effect=lambda url, **kwargs: contents[url]):
+            with pytest.raises(MessageError) as e:
+                mail.download_attachments(urls)
+        assert str(e.value) == "Attachments size exceeds the maximum allowed."
+
+        contents["https://test.com/big"] = AttachmentResponse(b"", status_code=404)
+        with mock.patch('requests.Session.get', side_effect=lambda url, **kwargs: contents[url]):
+            with pytest.raises(MessageError) as e:
+                mail.download_attachments(urls)
+        assert str(e.value) == "Failed to download attachment, error 404."
+
+    @mock.patch.dict(os.environ, {
+        "SMTP_SERVER": "mail.test.com:587",
+        "SMTP_LOGIN": "myself@test.com",
+        "SMTP_PASSWD": "passwd"
+    })
+    def test_send_batch_connection_lost(self, auth_headers):
+        smtp = mock.MagicMock()
+        smtp.return_value.noop.return_value = (250, b'OK')
+        disconnected = smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        smtp.return_value.send_message.side_effect = [None, disconnected, disconnected]
+        app = MailMS(env_var_prefix='SMTP')
+        with mock.patch.object(smtplib, 'SMTP', smtp), app.test_client() as c:
+            messages = [
+                {'subject': "Test", 'from_addr': "from@test.fr", 'to_addrs': f"to{i}@test.fr"} for i in range(3)
+            ]
+            response = c.post('/send/batch', json={'messages': messages}, headers=auth_headers)
+            assert response.status_code == 200
+            assert [r['status'] for r in response.json] == [200, 503, 503]
+            assert response.json[0]['message'] == "Mail sent to to0@test.fr"
+            assert smtp.call_count == 2
+
+            # reconnection failure
+            smtp.reset_mock()
+            smtp.return_value.send_message.side_effect = [None, disconnected]
+            smtp.return_value.login.side_effect = [None, smtplib.SMTPConnectError(421, "Unavailable")]
+            response = c.post('/send/batch', json={'messages': messages}, headers=auth_headers)
+            assert response.status_code == 200
+            assert [r['status'] for r in response.json] == [200, 503, 503]
@@ -0,0 +1,287 @@
+import json
+import os
+import socketserver
+import threading
+import time
+import xmlrpc.client
+import xmlrpc.server
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pytest
+import requests
+
+from coworks import TechMicroService
+from coworks import entry
+from coworks.blueprint.odoo_blueprint import KeepAliveTransport
+from coworks.blueprint.odoo_blueprint import Odoo
+
+
+fields_get_calls = []
+
+
+def execute_kw(db, uid, passwd, model, method, *args):
+    if method == 'fields_get':
+        fields_get_calls.append(model)
+        return {'id': {'type': 'integer'}, 'name': {'type': 'char'}, 'date': {'type': 'date'},
+                'image': {'type': 'binary'}, 'line_ids': {'type': 'one2many'}, 'tag_ids': {'type': 'many2many'}}
+    if model == 'error':
+        raise ValueError("Invalid model")
+    if model == 'empty':
+        return []
+    if model == 'paged':
+        domain, params = args
+        offset, limit = params.get('offset', 0), params.get('limit', 25)
+        records = [{'id': i, 'order': params.get('order', ''), 'fields': params.get('fields', [])} for i in range(25)]
+        return records[offset:offset + limit]
+    return [{'id': 1, 'model': model}]
+
+
+class XMLRPCServer(socketserver.ThreadingMixIn, xmlrpc.server.SimpleXMLRPCServer):
+    daemon_threads = True
+    block_on_close = False
+    connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+@pytest.fixture
+def xmlrpc_server():
+    server = XMLRPCServer(('127.0.0.1', 0), logRequests=False)
+    server.RequestHandlerClass.rpc_paths = ()
+    server.RequestHandlerClass.protocol_version = 'HTTP/1.1'
+    server.register_function(lambda *args: 2, 'authenticate')
+    server.register_function(execute_kw, 'execute_kw')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class OdooMS(TechMicroService):
+
+    def __init__(self):
+        super().__init__('odoo')
+        self.register_blueprint(Odoo(env_var_prefix='ODOO'), url_prefix='/odoo')
+
+    def token_authorizer(self, token):
+        return True
+
+    @entry
+    def get(self):
+        return "ok"
+
+
+def web_response(result=None, error=None, session_id='sid'):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = json.dumps({'error': error} if error else {'result': result}).encode()
+    response.cookies.set('session_id', session_id)
+    return response
+
+
+class TestClass:
+
+    def test_keep_alive_transport(self, xmlrpc_server):
+        odoo = Odoo(timeout=5)
+        odoo.url = f"http://127.0.0.1:{xmlrpc_server.server_address[1]}"
+        odoo.dbname, odoo.passwd = 'db', 'passwd'
+        odoo.uid = odoo.server_proxy('common').authenticate('db', 'user', 'passwd', {})
+        assert odoo.uid == 2
+
+        assert odoo.server_proxy('object') is odoo.server_proxy('object')
+        transport = odoo._transport
+        assert isinstance(transport, KeepAliveTransport)
+        assert transport.timeout == 5
+        for _ in range(3):
+            res, status_code = odoo.odoo_execute_kw('res.partner', 'search_read', [[]], {})
+            assert res == [{'id': 1, 'model': 'res.partner'}]
+        assert odoo._transport is transport
+        assert xmlrpc_server.connections == 1
+        transport.close()
+
+    def test_server_proxy_threads(self):
+        odoo = Odoo()
+        odoo.url = "http://127.0.0.1"
+        barrier = threading.Barrier(8)
+
+        def slow_transport(*args, **kwargs):
+            time.sleep(0.05)
+            return KeepAliveTransport(*args, **kwargs)
+
+        def get_proxy():
+            barrier.wait()
+            return odoo.server_proxy('object')
+
+        with mock.patch('coworks.blueprint.odoo_blueprint.KeepAliveTransport', side_effect=slow_transport) as init:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                proxies = list(executor.map(lambda _: get_proxy(), range(8)))
+        init.assert_called_once()
+        assert all(proxy is proxies[0] for proxy in proxies)
+        odoo._transport.close()
+
+    def test_fault(self, xmlrpc_server):
+        transport = KeepAliveTransport('http')
+        url = f"http://127.0.0.1:{xmlrpc_server.server_address[1]}/xmlrpc/2/object"
+        proxy = xmlrpc.client.ServerProxy(url, transport=transport)
+        with pytest.raises(xmlrpc.client.Fault):
+            proxy.undefined()
+        transport.close()
+
+    def test_session(self, xmlrpc_server, auth_headers):
+        url = f"http://127.0.0.1:{xmlrpc_server.server_address[1]}"
+        environ = {'ODOO_URL': url, 'ODOO_DBNAME': 'db', 'ODOO_USER': 'user', 'ODOO_PASSWD': 'passwd'}
+        app = OdooMS()
+        expired = {'code': 100, 'message': "Odoo Session Expired", 'data': {}}
+        responses = {
+            f"{url}/web/session/authenticate/": lambda: web_response({'session_id': 'sid'}),
+            f"{url}/report/1": lambda: web_response("pdf"),
+        }
+        with mock.patch.dict(os.environ, environ), mock.patch.object(requests, 'post') as post, \
+                app.test_client() as c:
+            post.side_effect = lambda path, **kwargs: responses[path]()
+
+            # no web session for routes outside the blueprint
+            response = c.get('/', headers=auth_headers)
+            assert response.status_code == 200
+            post.assert_not_called()
+
+            # web session opened once
+            for _ in range(2):
+                response = c.get('/odoo/pdf/1/2', headers=auth_headers)
+                assert response.status_code == 200
+                assert response.get_data(as_text=True) == "pdf"
+            assert [call.args[0] for call in post.call_args_list] == [
+                f"{url}/web/session/authenticate/", f"{url}/report/1", f"{url}/report/1"
+            ]
+
+            # web session renewed if rejected
+            post.reset_mock()
+            reports = iter([web_response(error=expired), web_response("pdf")])
+            responses[f"{url}/report/1"] = lambda: next(reports)
+            response = c.get('/odoo/pdf/1/2', headers=auth_headers)
+            assert response.status_code == 200
+            assert [call.args[0] for call in post.call_args_list] == [
+                f"{url}/report/1", f"{url}/web/session/authenticate/", f"{url}/report/1"
+            ]
+
+    def test_kw_batch(self, xmlrpc_server, auth_headers):
+        url = f"http://127.0.0.1:{xmlrpc_server.server_address[1]}"
+        environ = {'ODOO_URL': url, 'ODOO_DBNAME': 'db', 'ODOO_USER': 'user', 'ODOO_PASSWD': 'passwd'}
+        app = OdooMS()
+        queries = [
+            {'request_id': 'partners', 'model': 'res.partner', 'fields': ['name'], 'limit': 10},
+            {'model': 'sale.order', 'domain': [[['state', '=', 'sale']]], 'ensure_one': True},
+            {'model': 'empty'},
+            {'model': 'error'},
+            {'model': 'res.partner', 'unknown': True},
+            'res.partner',
+            ['res.partner'],
+        ]
+        with mock.patch.dict(os.environ, environ), app.test_client() as c:
+            response = c.post('/odoo/kw/batch', json={'queries': queries}, headers=auth_headers)
+            assert response.status_code == 200
+            results = response.json
+            assert set(results) == {'partners', '1', '2', '3', '4', '5', '6'}
+            partners = {'ids': [1], 'values': [{'id': 1, 'model': 'res.partner'}]}
+            assert results['partners'] == {'status': 200, 'result': partners}
+            assert results['1'] == {'status': 200, 'result': {'id': 1, 'model': 'sale.order'}}
+            assert results['2'] == {'status': 404, 'message': "Not found"}
+            assert results['3']['status'] == 500
+            assert "Invalid model" in results['3']['message']
+            assert results['4']['status'] == 400
+            assert results['5'] == {'status': 400, 'message': "Query must be an object"}
+            assert results['6'] == {'status': 400, 'message': "Query must be an object"}
+            assert xmlrpc_server.connections <= app.blueprints['odoo'].batch_max_workers + 1
+
+            response = c.post('/odoo/kw/batch', json={'queries': [{'model': 'a'}, {'model': 'b', 'request_id': '0'}]},
+                              headers=auth_headers)
+            assert response.status_code == 400
+            response = c.post('/odoo/kw/batch', json={'queries': {'model': 'a'}}, headers=auth_headers)
+            assert response.status_code == 400
+
+    def test_kw_cursor(self, xmlrpc_server, auth_headers):
+        url = f"http://127.0.0.1:{xmlrpc_server.server_address[1]}"
+        environ = {'ODOO_URL': url, 'ODOO_DBNAME': 'db', 'ODOO_USER': 'user', 'ODOO_PASSWD': 'passwd'}
+        app = OdooMS()
+        with mock.patch.dict(os.environ, environ), app.test_client() as c:
+            ids, cursor = [], None
+            for _ in range(3):
+                response = c.post('/odoo/kw/paged', json={'page_size': 10, 'order': 'name', 'cursor': cursor},
+                                  headers=auth_headers)
+                assert response.status_code == 200
+                ids.extend(response.json['ids'])
+                assert response.json['values'][0]['order'] == 'name, id'
+                cursor = response.json.get('cursor')
+            assert ids == list(range(25))
+            assert cursor is None
+
+            response = c.post('/odoo/kw/paged', json={'page_size': 10, 'order': 'date', 'cursor': cursor},
+                              headers=auth_headers)
+            assert response.status_code == 200
+            response = c.post('/odoo/kw/paged', json={'page_size': 10, 'cursor': response.json['cursor']},
+                              headers=auth_headers)
+            assert response.status_code == 400
+            response = c.post('/odoo/kw/paged', json={'page_size': 10, 'cursor': 'invalid'}, headers=auth_headers)
+            assert response.status_code == 400
+            response = c.post('/odoo/kw/paged', json={'page_size': 10, 'limit': 5}, headers=auth_headers)
+            assert response.status_code == 400
+
+            response = c.post('/odoo/kw/paged', json={'limit': 10, 'page': 2}, headers=auth_headers)
+            assert response.status_code == 200
+            assert response.json['ids'] == list(range(20, 25))
+
+    def test_kw_export(self, xmlrpc_server, auth_headers):
+        url = f"http://127.0.0.1:{xmlrpc_server.server_address[1]}"
+        environ = {'ODOO_URL': url, 'ODOO_DBNAME': 'db', 'ODOO_USER': 'user', 'ODOO_PASSWD': 'passwd'}
+        app = OdooMS()
+        with mock.patch.dict(os.environ, environ), app.test_client() as c:
+            response = c.post('/odoo/kw/export/paged', json={'chunk_size': 10}, headers=auth_headers)
+            assert response.status_code == 200
+            assert response.content_type == 'application/x-ndjson'
+            lines = response.get_data(as_text=True).splitlines()
+            assert [json.loads(line) for line in lines] == [{'id': i, 'order': 'id', 'fields': []} for i in range(25)]
+
+            with pytest.raises(xmlrpc.client.Fault):
+                c.post('/odoo/kw/export/error', headers=auth_headers)
+
+            for chunk_size in (0, -1, 'a'):
+                response = c.post('/odoo/kw/export/paged', json={'chunk_size': chunk_size}, headers=auth_headers)
+                assert response.status_code == 400
+
+    def test_fields(self, xmlrpc_server, auth_headers):
+        url = f"http://127.0.0.1:{xmlrpc_server.server_address[1]}"
+        environ = {'ODOO_URL': url, 'ODOO_DBNAME': 'db', 'ODOO_USER': 'user', 'ODOO_PASSWD': 'passwd'}
+        app = OdooMS()
+        odoo = app.blueprints['odoo']
+        fields_get_calls.clear()
+        with mock.patch.dict(os.environ, environ), app.test_client() as c:
+            response = c.post('/odoo/kw/paged', json={'limit': 1, 'light': True}, headers=auth_headers)
+            assert response.status_code == 200
+            assert response.json['values'][0]['fields'] == ['id', 'name', 'date', 'tag_ids']
+
+            response = c.post('/odoo/kw/paged', json={'limit': 1, 'fields': ['name', 'image']}, headers=auth_headers)
+            assert response.status_code == 200
+            assert response.json['values'][0]['fields'] == ['name', 'image']
+            assert fields_get_calls == ['paged']
+
+            response = c.post('/odoo/kw/paged', json={'fields': ['name', 'unknown']}, headers=auth_headers)
+            assert response.status_code == 400
+            assert response.get_data(as_text=True) == "Undefined fields for paged: unknown"
+            response = c.post('/odoo/kw/paged', json={'order': 'other desc, id'}, headers=auth_headers)
+            assert response.status_code == 400
+
+            response = c.post('/odoo/kw/paged', json={'limit': 1}, headers=auth_headers)
+            assert response.json['values'][0]['fields'] == []
+            odoo.light_projection = True
+            response = c.post('/odoo/kw/export/paged', json={'chunk_size': 100}, headers=auth_headers)
+            record = json.loads(response.get_data(as_text=True).splitlines()[0])
+            assert record['fields'] == ['id', 'name', 'date', 'tag_ids']
+            assert fields_get_calls == ['paged']
+
+            odoo.invalidate_fields('paged')
+            response = c.post('/odoo/kw/paged', json={'limit': 1}, headers=auth_headers)
+            assert response.status_code == 200
+            assert fields_get_calls == ['paged', 'paged']
@@ -3,6 +3,7 @@ from unittest.mock import MagicMock
 
 from coworks import TechMicroService, entry
 from coworks.globals import aws_event
+from coworks.globals import request
 
 
 class TechMS(TechMicroService):
@@ -84,3 +85,7 @@ class GlobalMS(TechMicroService):
     @entry
     def get_event_method(self):
         return aws_event['httpMethod']
+
+    @entry
+    def get_header(self):
+        return request.headers.get('x-test')
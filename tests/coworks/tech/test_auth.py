@@ -1,4 +1,7 @@
+from unittest.mock import Mock
+
 from coworks import entry
+from coworks.utils import LRUCache
 from tests.coworks.blueprint.blueprint import BP
 from tests.coworks.ms import SimpleMS
 
@@ -61,3 +64,52 @@ class TestClass:
             response = app(get_event('token'), empty_context)
             assert response['principalId'] == 'user'
             assert response['policyDocument']['Statement'][0]['Effect'] == 'Allow'
+
+    def test_policy_resource(self, empty_context):
+        app = AuthorizeAll()
+        with app.app_context() as c:
+            response = app(get_event('token'), empty_context)
+            resource = response['policyDocument']['Statement'][0]['Resource']
+            assert resource == 'arn:aws:execute-api:eu-west-1:935392763270:htzd2rneg1/dev/*'
+            app.config['CWS_AUTHORIZER_WILDCARD'] = False
+            response = app(get_event('token'), empty_context)
+            resource = response['policyDocument']['Statement'][0]['Resource']
+            assert resource == 'arn:aws:execute-api:eu-west-1:935392763270:htzd2rneg1/dev/GET/'
+
+    def test_authorizer_cache(self, empty_context):
+        app = AuthorizedMS()
+        app.token_authorizer = Mock(side_effect=lambda token: token == 'token')
+        with app.app_context() as c:
+            app(get_event('token'), empty_context)
+            app(get_event('token'), empty_context)
+            assert app.token_authorizer.call_count == 2
+
+            app.config['CWS_AUTHORIZER_CACHE_TTL'] = 60
+            response = app(get_event('token'), empty_context)
+            assert response['policyDocument']['Statement'][0]['Effect'] == 'Allow'
+            response = app(get_event('token'), empty_context)
+            assert response['policyDocument']['Statement'][0]['Effect'] == 'Allow'
+            response = app(get_event('wrong'), empty_context)
+            assert response['policyDocument']['Statement'][0]['Effect'] == 'Deny'
+            response = app(get_event('wrong'), empty_context)
+            assert response['policyDocument']['Statement'][0]['Effect'] == 'Deny'
+            assert app.token_authorizer.call_count == 4
+            assert 'token' not in app.authorizer_cache._values
+
+            app.invalidate_token('token')
+            app(get_event('token'), empty_context)
+            app(get_event('wrong'), empty_context)
+            assert app.token_authorizer.call_count == 5
+            app.invalidate_token()
+            assert len(app.authorizer_cache) == 0
+
+    def test_authorizer_cache_expiry(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set('a', True)
+        cache.set('b', False)
+        assert cache.get('a') is True
+        cache.set('c', True)
+        assert 'b' not in cache
+        assert 'a' in cache
+        cache.set('d', True, ttl=-1)
+        assert cache.get('d') is None
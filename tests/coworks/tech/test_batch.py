@@ -0,0 +1,116 @@
+import base64
+import json
+import threading
+import time
+
+from flask import g
+
+from coworks import TechMicroService
+from coworks import entry
+from coworks.globals import aws_event
+
+
+def sqs_record(message_id, body, path=None, group=None):
+    record = {
+        'messageId': message_id,
+        'receiptHandle': 'handle',
+        'body': body,
+        'attributes': {'ApproximateReceiveCount': '1'},
+        'messageAttributes': {},
+        'eventSource': 'aws:sqs',
+        'eventSourceARN': 'arn:aws:sqs:eu-west-1:935392763270:queue',
+        'awsRegion': 'eu-west-1',
+    }
+    if path:
+        record['messageAttributes']['path'] = {'stringValue': path, 'dataType': 'String'}
+    if group:
+        record['attributes']['MessageGroupId'] = group
+    return record
+
+
+def kinesis_record(sequence, data, partition_key):
+    return {
+        'kinesis': {
+            'partitionKey': partition_key,
+            'sequenceNumber': sequence,
+            'data': base64.b64encode(json.dumps(data).encode()).decode(),
+        },
+        'eventSource': 'aws:kinesis',
+        'eventID': f"shardId-000000000000:{sequence}",
+    }
+
+
+class BatchMS(TechMicroService):
+
+    def __init__(self):
+        super().__init__('batch')
+        self.processed = []
+        self.lock = threading.Lock()
+
+    def token_authorizer(self, token):
+        return False
+
+    @entry
+    def post(self, value=None, **kwargs):
+        if value == 'error':
+            raise Exception("record error")
+        with self.lock:
+            self.processed.append(value)
+
+    @entry
+    def post_g(self, value=None):
+        g.value = value
+        time.sleep(0.05)
+        with self.lock:
+            self.processed.append((value, g.value))
+
+    @entry
+    def post_text(self, text=None):
+        with self.lock:
+            self.processed.append((text, aws_event['record']['messageId']))
+        return text
+
+
+class TestClass:
+
+    def test_sqs_batch(self, empty_context):
+        app = BatchMS()
+        records = [sqs_record(str(i), json.dumps({'value': i})) for i in range(20)]
+        records[5] = sqs_record('5', json.dumps({'value': 'error'}))
+        response = app({'Records': records}, empty_context)
+        assert response == {'batchItemFailures': [{'itemIdentifier': '5'}]}
+        assert sorted(app.processed) == [i for i in range(20) if i != 5]
+
+    def test_sqs_path(self, empty_context):
+        app = BatchMS()
+        records = [sqs_record('1', 'a text', path='/text'), sqs_record('2', json.dumps({'unknown': 1}), path='/text')]
+        response = app({'Records': records}, empty_context)
+        assert response == {'batchItemFailures': [{'itemIdentifier': '2'}]}
+        assert app.processed == [('a text', '1')]
+
+    def test_sqs_fifo_group(self, empty_context):
+        app = BatchMS()
+        records = [
+            sqs_record('1', json.dumps({'value': 1}), group='a'),
+            sqs_record('2', json.dumps({'value': 'error'}), group='a'),
+            sqs_record('3', json.dumps({'value': 3}), group='a'),
+            sqs_record('4', json.dumps({'value': 4}), group='b'),
+        ]
+        response = app({'Records': records}, empty_context)
+        assert response == {'batchItemFailures': [{'itemIdentifier': '2'}, {'itemIdentifier': '3'}]}
+        assert sorted(app.processed) == [1, 4]
+
+    def test_kinesis_batch(self, empty_context):
+        app = BatchMS()
+        app.config['CWS_BATCH_MAX_WORKERS'] = 2
+        records = [kinesis_record(str(i), {'value': i}, str(i % 3)) for i in range(9)]
+        response = app({'Records': records}, empty_context)
+        assert response == {'batchItemFailures': []}
+        assert sorted(app.processed) == list(range(9))
+
+    def test_g_isolation(self, empty_context):
+        app = BatchMS()
+        records = [sqs_record(str(i), json.dumps({'value': i}), path='/g') for i in range(8)]
+        response = app({'Records': records}, empty_context)
+        assert response == {'batchItemFailures': []}
+        assert sorted(app.processed) == [(i, i) for i in range(8)]
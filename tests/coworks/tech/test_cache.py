@@ -0,0 +1,129 @@
+from unittest.mock import Mock
+
+import pytest
+
+from coworks import ResponseCache
+from coworks import entry
+from coworks.cache import CacheBackend
+from coworks.cache import RedisCacheBackend
+from tests.coworks.ms import TechMS
+from ..event import get_event
+
+
+class FakeRedis:
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, px=None):
+        self.values[key] = value.encode()
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+redis_cache = ResponseCache(ttl=60, backend=RedisCacheBackend(FakeRedis()))
+
+
+class CacheMS(TechMS):
+
+    def __init__(self):
+        super().__init__()
+        self.calls = Mock()
+
+    @entry(cache=60)
+    def get(self, value=None, other=None):
+        self.calls()
+        return {'value': value, 'other': other}
+
+    @entry(cache=ResponseCache(ttl=60, vary='Accept-Language'))
+    def get_lang(self):
+        self.calls()
+        return "language"
+
+    @entry(cache=60)
+    def get_error(self):
+        self.calls()
+        return "error", 500
+
+    @entry(cache=redis_cache)
+    def get_shared(self):
+        self.calls()
+        return "shared"
+
+    @entry(binary=True, cache=-1)
+    def get_expired(self):
+        self.calls()
+        return b"expired"
+
+
+class TestClass:
+
+    def test_cached(self):
+        app = CacheMS()
+        with app.test_client() as c:
+            response = c.get('/?value=1&other=2', headers={'Authorization': 'token'})
+            assert response.status_code == 200
+            assert response.json == {'value': '1', 'other': '2'}
+            response = c.get('/?other=2&value=1', headers={'Authorization': 'token'})
+            assert response.status_code == 200
+            assert response.json == {'value': '1', 'other': '2'}
+            assert app.calls.call_count == 1
+            response = c.get('/?value=2', headers={'Authorization': 'token'})
+            assert response.json == {'value': '2', 'other': None}
+            assert app.calls.call_count == 2
+
+    def test_cached_lambda(self, empty_context):
+        app = CacheMS()
+        with app.app_context() as c:
+            response = app(get_event('/', 'get', params={'value': ['1']}), empty_context)
+            assert response['statusCode'] == 200
+            response = app(get_event('/', 'get', params={'value': ['1']}), empty_context)
+            assert response['statusCode'] == 200
+            assert response['body'] == {'value': '1', 'other': None}
+            assert app.calls.call_count == 1
+
+    def test_vary(self):
+        app = CacheMS()
+        with app.test_client() as c:
+            c.get('/lang', headers={'Authorization': 'token', 'Accept-Language': 'fr'})
+            c.get('/lang', headers={'Authorization': 'token', 'Accept-Language': 'fr'})
+            assert app.calls.call_count == 1
+            response = c.get('/lang', headers={'Authorization': 'token', 'Accept-Language': 'en'})
+            assert response.get_data(as_text=True) == "language"
+            assert app.calls.call_count == 2
+
+    def test_not_cached(self):
+        app = CacheMS()
+        with app.test_client() as c:
+            c.get('/error', headers={'Authorization': 'token'})
+            response = c.get('/error', headers={'Authorization': 'token'})
+            assert response.status_code == 500
+            assert app.calls.call_count == 2
+            c.get('/expired', headers={'Authorization': 'token'})
+            response = c.get('/expired', headers={'Authorization': 'token'})
+            assert response.data == b"expired"
+            assert app.calls.call_count == 4
+
+    def test_redis_backend(self):
+        app = CacheMS()
+        with app.test_client() as c:
+            first = c.get('/shared', headers={'Authorization': 'token'})
+            response = c.get('/shared', headers={'Authorization': 'token'})
+            assert response.get_data(as_text=True) == "shared"
+            assert response.headers['content-type'] == first.headers['content-type']
+            assert app.calls.call_count == 1
+            redis_cache.invalidate(app, '/shared')
+            c.get('/shared', headers={'Authorization': 'token'})
+            assert app.calls.call_count == 2
+
+    def test_incomplete_backend(self):
+        class IncompleteBackend(CacheBackend):
+            def get(self, key):
+                return None
+
+        with pytest.raises(TypeError):
+            IncompleteBackend()
@@ -0,0 +1,77 @@
+import gzip
+from unittest import mock
+
+from coworks import entry
+from tests.coworks.ms import TechMS
+from ..event import get_event
+
+
+class CompressMS(TechMS):
+
+    def __init__(self):
+        super().__init__()
+        self.config['CWS_COMPRESSION_MIN_SIZE'] = 100
+
+    @entry
+    def get(self):
+        return {'values': ['value'] * 100}
+
+    @entry
+    def get_small(self):
+        return {'value': 1}
+
+    @entry(binary=True)
+    def get_binary(self):
+        return b"0" * 1000
+
+
+class TestClass:
+
+    def test_compressed(self):
+        app = CompressMS()
+        with app.test_client() as c:
+            response = c.get('/', headers={'Authorization': 'token', 'Accept-Encoding': 'gzip, deflate'})
+            assert response.status_code == 200
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert 'Accept-Encoding' in response.headers['Vary']
+            assert gzip.decompress(response.data) == b'{"values":[' + b','.join([b'"value"'] * 100) + b']}\n'
+
+    def test_not_compressed(self):
+        app = CompressMS()
+        with app.test_client() as c:
+            response = c.get('/', headers={'Authorization': 'token'})
+            assert 'Content-Encoding' not in response.headers
+            response = c.get('/small', headers={'Authorization': 'token', 'Accept-Encoding': 'gzip'})
+            assert 'Content-Encoding' not in response.headers
+            response = c.get('/binary', headers={'Authorization': 'token', 'Accept-Encoding': 'gzip'})
+            assert 'Content-Encoding' not in response.headers
+            app.config['CWS_COMPRESSION_MIN_SIZE'] = None
+            response = c.get('/', headers={'Authorization': 'token', 'Accept-Encoding': 'gzip'})
+            assert 'Content-Encoding' not in response.headers
+
+    def test_lambda_not_compressed(self, empty_context):
+        app = CompressMS()
+        headers = {'Authorization': 'token', 'content-type': 'application/json', 'Accept-Encoding': 'gzip'}
+        with app.app_context() as c:
+            response = app(get_event('/', 'get', headers=headers), empty_context)
+            assert response['statusCode'] == 200
+            assert response['isBase64Encoded'] is False
+            assert 'Content-Encoding' not in response['headers']
+            assert response['body'] == {'values': ['value'] * 100}
+
+    def test_compressed_etag(self):
+        app = CompressMS()
+        app.config['CWS_ETAG'] = True
+        headers = {'Authorization': 'token', 'Accept-Encoding': 'gzip'}
+        with app.test_client() as c:
+            with mock.patch('gzip.time.time', return_value=1000):
+                response = c.get('/', headers=headers)
+            assert response.status_code == 200
+            assert response.headers['Content-Encoding'] == 'gzip'
+            etag = response.headers['ETag']
+            with mock.patch('gzip.time.time', return_value=2000):
+                response = c.get('/', headers=headers)
+                assert response.headers['ETag'] == etag
+                response = c.get('/', headers={**headers, 'If-None-Match': etag})
+            assert response.status_code == 304
+            assert 'Content-Encoding' not in response.headers
@@ -1,5 +1,7 @@
 from coworks import TechMicroService
+from coworks.wrappers import ApiResponse
 from coworks import entry
+from coworks.utils import base64_encode_chunks
 
 from ..event import get_event
 
@@ -26,6 +28,10 @@ class ContentMS(TechMicroService):
     def get_binary(self):
         return b"test"
 
+    @entry(binary=True)
+    def get_binary_chunks(self):
+        return ApiResponse((c for c in [b"a", b"bcdefghij", b"abcdefghija", b"bcdefghij"]))
+
     @entry(binary=True, content_type='application/pdf')
     def get_content_type(self):
         return b"test"
@@ -106,3 +112,23 @@ class TestClass:
             assert type(response) == str
             assert app.base64decode(response) == b"test"
 
+
+    def test_binary_chunks(self, empty_context):
+        app = ContentMS()
+        with app.app_context() as c:
+            headers = {'Accept': 'img/webp', 'Authorization': 'token'}
+            response = app(get_event('/binary/chunks', 'get', headers=headers), empty_context)
+            assert type(response) == str
+            assert app.base64decode(response) == b"abcdefghij" * 3
+            assert base64_encode_chunks([b"a", b"", b"bcdefghij", b"abcdefghija", b"bcdefghij"]) == response
+
+    def test_binary_too_large(self, empty_context):
+        app = ContentMS()
+        app.config['CWS_MAX_PAYLOAD_SIZE'] = 8
+        with app.app_context() as c:
+            headers = {'Accept': 'img/webp', 'Authorization': 'token'}
+            response = app(get_event('/binary', 'get', headers=headers), empty_context)
+            assert type(response) == str
+            response = app(get_event('/binary/chunks', 'get', headers=headers), empty_context)
+            assert response['statusCode'] == 500
+            assert 'too large' in response['body']
@@ -0,0 +1,100 @@
+from unittest.mock import Mock
+
+from coworks import entry
+from tests.coworks.ms import TechMS
+from ..event import get_event
+
+
+class EtagMS(TechMS):
+
+    def __init__(self):
+        super().__init__()
+        self.calls = Mock()
+
+    @entry(etag=True)
+    def get(self, value=None):
+        self.calls()
+        return {'value': value}
+
+    @entry(etag=lambda self, ref: f"v-{ref}")
+    def get_version(self, ref):
+        self.calls()
+        return f"version {ref}"
+
+    @entry(etag=True)
+    def get_large(self):
+        return {'values': ['value'] * 100}
+
+    @entry
+    def get_none(self):
+        return "no etag"
+
+
+class TestClass:
+
+    def test_body_etag(self):
+        app = EtagMS()
+        with app.test_client() as c:
+            response = c.get('/?value=1', headers={'Authorization': 'token'})
+            assert response.status_code == 200
+            etag = response.headers['ETag']
+            response = c.get('/?value=1', headers={'Authorization': 'token', 'If-None-Match': etag})
+            assert response.status_code == 304
+            assert response.data == b''
+            response = c.get('/?value=2', headers={'Authorization': 'token', 'If-None-Match': etag})
+            assert response.status_code == 200
+            assert response.headers['ETag'] != etag
+            response = c.get('/none', headers={'Authorization': 'token'})
+            assert 'ETag' not in response.headers
+
+    def test_version_etag(self):
+        app = EtagMS()
+        with app.test_client() as c:
+            response = c.get('/version/1', headers={'Authorization': 'token'})
+            assert response.status_code == 200
+            assert response.headers['ETag'] == '"v-1"'
+            response = c.get('/version/1', headers={'Authorization': 'token', 'If-None-Match': '"v-1"'})
+            assert response.status_code == 304
+            assert app.calls.call_count == 1
+
+    def test_lambda_etag(self, empty_context):
+        app = EtagMS()
+        with app.app_context() as c:
+            response = app(get_event('/', 'get'), empty_context)
+            assert response['statusCode'] == 200
+            etag = response['headers']['ETag']
+            headers = {'Authorization': 'token', 'content-type': 'application/json', 'If-None-Match': etag}
+            response = app(get_event('/', 'get', headers=headers), empty_context)
+            assert response['statusCode'] == 304
+            assert response['body'] == ""
+            assert response['headers']['ETag'] == etag
+
+    def test_global_etag(self):
+        app = EtagMS()
+        app.config['CWS_ETAG'] = True
+        with app.test_client() as c:
+            response = c.get('/none', headers={'Authorization': 'token'})
+            assert 'ETag' in response.headers
+
+    def test_compressed_etag(self):
+        app = EtagMS()
+        app.config['CWS_COMPRESSION_MIN_SIZE'] = 100
+        with app.test_client() as c:
+            response = c.get('/large', headers={'Authorization': 'token'})
+            assert 'Content-Encoding' not in response.headers
+            assert 'Accept-Encoding' in response.headers['Vary']
+            etag = response.headers['ETag']
+            assert not etag.startswith('W/')
+
+            headers = {'Authorization': 'token', 'Accept-Encoding': 'gzip'}
+            response = c.get('/large', headers=headers)
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert 'Accept-Encoding' in response.headers['Vary']
+            assert response.headers['ETag'] == f"W/{etag}"
+
+            response = c.get('/large', headers={**headers, 'If-None-Match': f"W/{etag}"})
+            assert response.status_code == 304
+            assert response.headers['ETag'] == f"W/{etag}"
+            response = c.get('/large', headers={'Authorization': 'token', 'If-None-Match': f"W/{etag}"})
+            assert response.status_code == 304
+            assert response.headers['ETag'] == etag
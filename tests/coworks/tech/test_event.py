@@ -1,4 +1,10 @@
+import json
+from datetime import datetime
+from types import SimpleNamespace
 from unittest.mock import Mock
+from unittest.mock import patch
+
+import pytest
 
 from coworks import TechMicroService
 from coworks import entry
@@ -31,6 +37,24 @@ class ErrorMS(TechMicroService):
         return int("a")
 
 
+class JsonMS(TechMicroService):
+
+    def token_authorizer(self, token):
+        return True
+
+    @entry
+    def get(self):
+        return {'text': 'value', 'int': 1}
+
+    @entry
+    def get_list(self):
+        return [1, 'value']
+
+    @entry
+    def get_date(self):
+        return {'date': datetime(2022, 1, 1)}
+
+
 class TestClass:
     def test_request_arg(self, empty_context):
         app = SimpleMS()
@@ -124,3 +148,93 @@ class TestClass:
             response = app(event, empty_context)
             assert response['statusCode'] == 500
             app.err.assert_called_once()
+
+    def test_request_client_dispatch(self, empty_context):
+        app = SimpleMS()
+        app.config['CWS_DIRECT_DISPATCH'] = False
+        with app.app_context() as c:
+            response = app(get_event('/content/3', 'post', body={"other": 'other'}), empty_context)
+            assert response['statusCode'] == 200
+            assert response['body'] == "post content with 3 and other"
+            response = app(get_event('/kwparam2', 'get', params={"other": ['other'], "value": [5]}), empty_context)
+            assert response['statusCode'] == 200
+            assert response['body'] == "get **param with 5 and ['other']"
+
+    def test_request_query_encoding(self, empty_context):
+        app = SimpleMS()
+        with app.app_context() as c:
+            response = app(get_event('/kwparam1', 'get', params={'value': ['a&b=c']}), empty_context)
+            assert response['statusCode'] == 200
+            assert response['body'] == "get **param with only a&b=c"
+
+    def test_request_headers(self, empty_context):
+        app = GlobalMS()
+        with app.app_context() as c:
+            headers = {'x-test': 'header value', 'content-type': 'application/json'}
+            response = app(get_event('/header', 'get', headers=headers), empty_context)
+            assert response['statusCode'] == 200
+            assert response['body'] == "header value"
+
+    def test_request_json_value(self, empty_context):
+        app = JsonMS()
+        with app.app_context() as c:
+            with patch.object(app, 'json_loads', wraps=app.json_loads) as json_loads:
+                response = app(get_event('/', 'get'), empty_context)
+                assert response['statusCode'] == 200
+                assert response['body'] == {'int': 1, 'text': 'value'}
+                response = app(get_event('/list', 'get'), empty_context)
+                assert response['statusCode'] == 200
+                assert response['body'] == [1, 'value']
+                json_loads.assert_not_called()
+                response = app(get_event('/date', 'get'), empty_context)
+                assert response['statusCode'] == 200
+                assert response['body'] == {'date': 'Sat, 01 Jan 2022 00:00:00 GMT'}
+                json_loads.assert_called_once()
+
+    def test_request_json_backend(self, empty_context):
+        app = JsonMS()
+        dumps = Mock(side_effect=lambda obj, default: json.dumps(obj, default=default).encode())
+        app.config['CWS_JSON_BACKEND'] = SimpleNamespace(dumps=dumps, loads=json.loads)
+        with app.app_context() as c:
+            response = app(get_event('/', 'get'), empty_context)
+            assert response['statusCode'] == 200
+            assert response['body'] == {'int': 1, 'text': 'value'}
+            dumps.assert_not_called()
+        with app.test_client() as c:
+            response = c.get('/', headers={'Authorization': 'token'})
+            assert response.get_data(as_text=True) == '{"text": "value", "int": 1}'
+            dumps.assert_called_once()
+
+    def test_request_json_backend_types(self, empty_context):
+        pytest.importorskip('orjson')
+        app = JsonMS()
+        app.config['CWS_JSON_BACKEND'] = 'orjson'
+        with app.app_context() as c:
+            response = app(get_event('/date', 'get'), empty_context)
+            assert response['statusCode'] == 200
+            assert response['body'] == {'date': '2022-01-01T00:00:00'}
+            json.dumps(response)
+        with app.test_client() as c:
+            response = c.get('/date', headers={'Authorization': 'token'})
+            assert response.json == {'date': '2022-01-01T00:00:00'}
+
+    def test_warm_invocation(self, empty_context):
+        app = JsonMS()
+        with patch.object(app, '_update_config', wraps=app._update_config) as update_config:
+            response = app(get_event('/', 'get'), empty_context)
+            assert response['statusCode'] == 200
+            response = app(get_event('/', 'get'), empty_context)
+            assert response['statusCode'] == 200
+            update_config.assert_called_once()
+
+    def test_lazy_logging(self, caplog):
+        app = JsonMS()
+        context = Mock()
+        context.__str__ = Mock(return_value="context")
+        caplog.set_level('INFO', logger=app.logger.name)
+        response = app(get_event('/', 'get'), context)
+        assert response['statusCode'] == 200
+        context.__str__.assert_not_called()
+        caplog.set_level('DEBUG', logger=app.logger.name)
+        app(get_event('/', 'get'), context)
+        context.__str__.assert_called()
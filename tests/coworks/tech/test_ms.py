@@ -1,4 +1,10 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from coworks.coworks import ApiResponse
+from coworks.utils import get_event_loop
+from coworks.utils import run_coroutine
 from tests.coworks.ms import *
 
 
@@ -233,3 +239,55 @@ class TestClass:
             response = c.post('/test', headers={'Authorization': 'token'})
             assert response.status_code == 200
             assert response.json == {'value': "ok"}
+
+
+class AsyncMS(TechMS):
+
+    @entry
+    async def get(self, value=None):
+        return {'value': value, 'path': request.path}
+
+    @entry
+    async def get_gather(self, count=3):
+        async def upstream(i):
+            await asyncio.sleep(0.1)
+            return i
+
+        return {'values': await asyncio.gather(*(upstream(i) for i in range(int(count))))}
+
+
+class TestAsyncClass:
+
+    def test_async_entry(self):
+        app = AsyncMS()
+        with app.test_client() as c:
+            response = c.get('/?value=test', headers={'Authorization': 'token'})
+            assert response.status_code == 200
+            assert response.json == {'value': 'test', 'path': '/'}
+
+    def test_async_gather(self):
+        app = AsyncMS()
+        with app.test_client() as c:
+            start = time.perf_counter()
+            response = c.get('/gather?count=5', headers={'Authorization': 'token'})
+            assert response.status_code == 200
+            assert response.json == {'values': [0, 1, 2, 3, 4]}
+            assert time.perf_counter() - start < 0.4
+
+    def test_async_loop_reused(self):
+        app = AsyncMS()
+        with app.test_client() as c:
+            c.get('/', headers={'Authorization': 'token'})
+            loop = get_event_loop()
+            c.get('/', headers={'Authorization': 'token'})
+            assert get_event_loop() is loop
+            assert not loop.is_closed()
+
+    def test_async_loop_closed_in_thread(self):
+        async def running_loop():
+            return asyncio.get_running_loop()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            loops = list(executor.map(lambda _: run_coroutine(running_loop()), range(4)))
+        assert all(loop.is_closed() for loop in loops)
+        assert run_coroutine(running_loop()) is get_event_loop()
@@ -0,0 +1,74 @@
+import base64
+import io
+from tempfile import SpooledTemporaryFile
+
+from coworks import entry
+from coworks.utils import Base64DecodeStream
+from tests.coworks.ms import TechMS
+from ..event import get_event
+
+BOUNDARY = 'testboundary'
+
+
+def multipart(size):
+    data = (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"text\"\r\n\r\nvalue\r\n"
+            f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"test.bin\"\r\n"
+            f"Content-Type: application/octet-stream\r\n\r\n").encode()
+    data += b"x" * size + f"\r\n--{BOUNDARY}--\r\n".encode()
+    return base64.b64encode(data).decode()
+
+
+def upload_event(path, size):
+    headers = {'Authorization': 'token', 'content-type': f"multipart/form-data; boundary={BOUNDARY}"}
+    event = get_event(path, 'post', body=multipart(size), headers=headers)
+    event['isBase64Encoded'] = True
+    return event
+
+
+class UploadMS(TechMS):
+
+    @entry(max_memory_size=1024)
+    def post(self, text=None, file=None):
+        assert isinstance(file.stream, SpooledTemporaryFile)
+        return {'text': text, 'size': len(file.read()), 'rolled': file.stream._rolled}
+
+    @entry(max_content_length=1024)
+    def post_small(self, text=None, file=None):
+        return {'size': len(file.read())}
+
+
+class TestClass:
+
+    def test_base64_stream(self):
+        for size in (0, 1, 2, 3, 100, 100000):
+            data = bytes(range(256)) * (size // 256) + b"a" * (size % 256)
+            stream = Base64DecodeStream(base64.b64encode(data).decode(), buffer_size=7)
+            assert stream.read() == data
+            stream = Base64DecodeStream(base64.b64encode(data).decode())
+            assert b''.join(iter(lambda: stream.read(5), b'')) == data
+
+    def test_spooled_upload(self, empty_context):
+        app = UploadMS()
+        with app.app_context() as c:
+            response = app(upload_event('/', 100), empty_context)
+            assert response['statusCode'] == 200
+            assert response['body'] == {'text': 'value', 'size': 100, 'rolled': False}
+            response = app(upload_event('/', 10000), empty_context)
+            assert response['statusCode'] == 200
+            assert response['body'] == {'text': 'value', 'size': 10000, 'rolled': True}
+
+    def test_max_content_length(self, empty_context):
+        app = UploadMS()
+        with app.app_context() as c:
+            response = app(upload_event('/small', 100), empty_context)
+            assert response['statusCode'] == 200
+            response = app(upload_event('/small', 10000), empty_context)
+            assert response['statusCode'] == 413
+
+    def test_client_upload(self):
+        app = UploadMS()
+        with app.test_client() as c:
+            data = {'text': 'value', 'file': (io.BytesIO(b"x" * 2000), 'test.bin')}
+            response = c.post('/', data=data, content_type='multipart/form-data', headers={'Authorization': 'token'})
+            assert response.status_code == 200
+            assert response.json == {'text': 'value', 'size': 2000, 'rolled': True}
@@ -2,12 +2,15 @@ from pathlib import Path
 from unittest.mock import Mock
 
 import boto3
+import click
+import pytest
 from flask.cli import ScriptInfo
 
 from coworks import Blueprint
 from coworks import TechMicroService
 from coworks import entry
 from coworks.cws.deploy import TerraformLocal
+from coworks.cws.deploy import deploy_command
 from coworks.utils import import_attr
 
 
@@ -100,3 +103,50 @@ class TestClass:
         assert lines[22].strip() == 'envtechms_when_stage = terraform.workspace != "default" ? 1 : 0'
         (Path(example_dir) / "terraform" / "test.tf").unlink()
         (Path(example_dir) / "terraform").rmdir()
+
+    def test_shared_jinja_env(self, example_dir, progressbar):
+        app = TechMS()
+        with app.test_request_context() as ctx:
+            info = ScriptInfo(create_app=lambda _: app)
+            terraform = TerraformLocal(info, progressbar, terraform_dir="terraform")
+            other = TerraformLocal(info, progressbar, terraform_dir="other")
+            assert terraform.jinja_env is other.jinja_env
+            assert terraform.jinja_env.get_template("deploy.j2") is other.jinja_env.get_template("deploy.j2")
+
+    @pytest.mark.parametrize('project_value', [
+        'application/pdf', 'application/pdf, image/png', ['application/pdf', 'image/png']
+    ])
+    def test_binary_media_types(self, monkeypatch, example_dir, progressbar, project_value):
+        param = next(param for param in deploy_command.params if param.name == 'binary_media_types')
+
+        # default set from the project file as done by the client
+        monkeypatch.setattr(param, 'default', project_value)
+        value, _ = param.handle_parse_result(click.Context(deploy_command), {}, [])
+        expected = ['application/pdf'] if project_value == 'application/pdf' else ['application/pdf', 'image/png']
+        assert value == expected
+        value, _ = param.handle_parse_result(click.Context(deploy_command), {'binary_media_types': 'text/csv'}, [])
+        assert value == ['text/csv']
+
+        monkeypatch.setattr(boto3, "Session", Mock(return_value=Mock(return_value='region')))
+        app = import_attr('cmd', 'app', cwd=example_dir)
+        with app.test_request_context() as ctx:
+            options = {
+                'project_dir': example_dir,
+                'workspace': 'workspace',
+                'debug': False,
+                'profile_name': 'profile_name',
+                'timeout': 30,
+                'memory_size': 100,
+                'binary_media_types': expected,
+            }
+            info = ScriptInfo(create_app=lambda _: app)
+            terraform = TerraformLocal(info, progressbar, terraform_dir=Path(example_dir) / "terraform")
+            terraform.generate_files("deploy.j2", "test.tf", **options)
+        tf_file = Path(example_dir) / "terraform" / "test.tf"
+        try:
+            lines = [line.strip() for line in tf_file.read_text().splitlines()]
+            media_types = ', '.join(f'"{media_type}"' for media_type in expected)
+            assert f"binary_media_types = concat(local.envtechms_api_binary_media_types, [{media_types}])" in lines
+        finally:
+            tf_file.unlink()
+            tf_file.parent.rmdir()
@@ -0,0 +1,57 @@
+import json
+import os
+import shutil
+import zipfile
+from unittest import mock
+
+import pytest
+
+from coworks.config import ROUTES_FILE_NAME
+from coworks.cws.client import client
+from tests.cws.src.app import EnvTechMS
+
+
+@pytest.fixture
+def zip_archives(tmp_path):
+    """Keeps a copy of the zip archives created (the temporary build folder is removed by the command)."""
+    archives = []
+
+    def make_archive(base_name, *args, **kwargs):
+        archive = shutil.make_archive(base_name, *args, **kwargs)
+        archives.append(shutil.copy(archive, tmp_path))
+        return archive
+
+    with mock.patch('coworks.cws.zip.make_archive', side_effect=make_archive):
+        yield archives
+
+
+class TestClass:
+
+    @mock.patch.dict(os.environ, {"FLASK_APP": "cmd:app"})
+    def test_zip_routes(self, example_dir, tmp_path, zip_archives):
+        client.main(['--project-dir', example_dir, 'zip', '-b', 'bucket', '-p', 'profile', '--dry'], 'cws',
+                    standalone_mode=False)
+        with zipfile.ZipFile(zip_archives[0]) as archive:
+            assert ROUTES_FILE_NAME in archive.namelist()
+            archive.extract(ROUTES_FILE_NAME, tmp_path)
+
+        app = EnvTechMS()
+        data = json.loads((tmp_path / ROUTES_FILE_NAME).read_text())
+        assert data['routes'] == app.routes_snapshot()
+        assert data['hash'] == app.routes_source_hash()
+
+        # cold start in Lambda uses the routes file instead of discovering the routes
+        loaded = EnvTechMS()
+        with mock.patch.dict(os.environ, {'LAMBDA_TASK_ROOT': str(tmp_path)}):
+            with mock.patch('coworks.utils.create_route_entries') as create_route_entries:
+                with loaded.app_context():
+                    create_route_entries.assert_not_called()
+        assert loaded._cws_loaded_route_entries is not None
+        assert sorted(loaded.routes) == sorted(app.routes)
+
+    @mock.patch.dict(os.environ, {"FLASK_APP": "cmd:app"})
+    def test_zip_no_routes(self, example_dir, zip_archives):
+        client.main(['--project-dir', example_dir, 'zip', '-b', 'bucket', '-p', 'profile', '--dry', '--no-routes'],
+                    'cws', standalone_mode=False)
+        with zipfile.ZipFile(zip_archives[0]) as archive:
+            assert ROUTES_FILE_NAME not in archive.namelist()